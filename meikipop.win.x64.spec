@@ -11,6 +11,8 @@ a = Analysis(
         ('src/meikipop/ocr/providers/glensv2/__init__.py', 'meikipop/ocr/providers/glensv2'),
         ('src/meikipop/ocr/providers/owocr/provider.py', 'meikipop/ocr/providers/owocr'),
         ('src/meikipop/ocr/providers/owocr/__init__.py', 'meikipop/ocr/providers/owocr'),
+        ('src/meikipop/ocr/providers/textsource/provider.py', 'meikipop/ocr/providers/textsource'),
+        ('src/meikipop/ocr/providers/textsource/__init__.py', 'meikipop/ocr/providers/textsource'),
         ('src/meikipop/ocr/providers/meikiocr/provider.py', 'meikipop/ocr/providers/meikiocr'),
         ('src/meikipop/ocr/providers/meikiocr/__init__.py', 'meikipop/ocr/providers/meikiocr'),
         ('src/meikipop/ocr/providers/screenai/provider.py', 'meikipop/ocr/providers/screenai'),
@@ -22,7 +24,7 @@ a = Analysis(
         ('src/meikipop/resources/icon.inactive.ico', 'meikipop/resources'),
         ('src/meikipop/scripts/deconjugator.json', 'meikipop/scripts'),
     ],
-    hiddenimports=['meikipop.ocr.providers.glensv2', 'meikipop.ocr.providers.owocr', 'meikipop.ocr.providers.meikiocr', 'meikipop.ocr.providers.screenai'],
+    hiddenimports=['meikipop.ocr.providers.glensv2', 'meikipop.ocr.providers.owocr', 'meikipop.ocr.providers.textsource', 'meikipop.ocr.providers.meikiocr', 'meikipop.ocr.providers.screenai'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
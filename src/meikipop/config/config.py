@@ -32,8 +32,13 @@ class Config:
             'hotkey': 'shift',
             'scan_region': 'region',
             'max_lookup_length': 25,
+            'lookup_prefetch_radius': 2,
+            'lookup_cache_size_kb': 16384,
             'glens_low_bandwidth': False,
             'ocr_provider': 'meikiocr (local)',
+            'ocr_warm_up': True,
+            'text_source': 'websocket',
+            'text_source_websocket_uri': 'ws://127.0.0.1:6677',
             'auto_scan_mode': True,
             'auto_scan_mode_lookups_without_hotkey': True,
             'auto_scan_interval_seconds': 0.5,
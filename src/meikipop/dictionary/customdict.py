@@ -1,11 +1,17 @@
 # customdict.py
+import hashlib
+import json
 import logging
+import os
 import pickle
+import re
+import sys
 import time
 import urllib.request
 import zipfile
 import io
 from collections import defaultdict
+from typing import Callable, Iterable, NamedTuple, Optional
 
 from meikipop.utils.paths import paths
 
@@ -14,17 +20,175 @@ logger = logging.getLogger(__name__)
 DICT_URL = "https://github.com/rtr46/meikipop/releases/download/dictionary-latest/dictionary.zip"
 
 DEFAULT_FREQ = 999_999
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
 
-# MapEntry tuple field indices. value: (written_form, reading, freq, entry_id)
+# progress_callback(message, fraction) - fraction is None when progress cannot be measured
+ProgressCallback = Callable[[str, Optional[float]], None]
+
+# Layout of the pickled dictionary, stored as 'format_version'. Pickles without the key are version 1.
+#   1: map entries are (written_form, reading, freq, entry_id)
+#   2: map entries carry a pos_mask as 5th field, with the bit vocabulary in 'pos_vocab'
+DICT_FORMAT_VERSION = 2
+POS_MASK_FORMAT_VERSION = 2
+
+# MapEntry tuple field indices. value: (written_form, reading, freq, entry_id, pos_mask)
+# the pos_mask only exists from POS_MASK_FORMAT_VERSION on, see has_pos_masks()
 WRITTEN_FORM_INDEX = 0
 READING_INDEX = 1
 FREQUENCY_INDEX = 2
 ENTRY_ID_INDEX = 3
+POS_MASK_INDEX = 4
+
+
+class Sense(NamedTuple):
+    """
+    One sense of a loaded dictionary entry. Pickles store senses as plain
+    {'glosses', 'pos', 'tags'} dicts, so older releases can still read them; load_dictionary()
+    turns them into Senses. sense['glosses'] and sense.get('glosses') work like on the dicts.
+    """
+    glosses: tuple
+    pos: tuple
+    tags: tuple
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+
+def wrap_senses(entries: dict):
+    """Turns the sense dicts of freshly loaded `entries` into Sense tuples, in place."""
+    for entry_id, senses in entries.items():
+        entries[entry_id] = [s if isinstance(s, Sense) else Sense(s['glosses'], s['pos'], s.get('tags', ()))
+                             for s in senses]
+
+
+def compact_entries(entries: dict, lookup_map: dict):
+    """
+    Shrinks a freshly built dictionary in place before it is pickled: identical gloss lists become
+    one shared tuple, and all pos/tag strings as well as the written forms and readings in
+    `lookup_map` are interned. Pickle stores shared objects only once, so the sharing survives the
+    round trip. Senses stay builtin dicts in the pickle, see Sense.
+    """
+    glosses_cache: dict[tuple, tuple] = {}
+    strings_cache: dict[tuple, tuple] = {}
+
+    def shared_strings(values, cache) -> tuple:
+        key = tuple(values)
+        shared = cache.get(key)
+        if shared is None:
+            shared = cache[key] = tuple(sys.intern(v) for v in key)
+        return shared
+
+    for entry_id, senses in entries.items():
+        entries[entry_id] = [{'glosses': shared_strings(s['glosses'], glosses_cache),
+                              'pos': shared_strings(s['pos'], strings_cache),
+                              'tags': shared_strings(s['tags'], strings_cache)}
+                             for s in senses]
+    for surface, me_list in lookup_map.items():
+        lookup_map[surface] = [(sys.intern(me[WRITTEN_FORM_INDEX]) if me[WRITTEN_FORM_INDEX] else me[WRITTEN_FORM_INDEX],
+                                sys.intern(me[READING_INDEX]) if me[READING_INDEX] else me[READING_INDEX],
+                                *me[FREQUENCY_INDEX:])
+                               for me in me_list]
+
+
+def build_pos_vocab(entries: dict, deconjugator_rules: list) -> list[str]:
+    """
+    Every part-of-speech tag of the dictionary, in bit order. Tags the deconjugator can require
+    come first, so the masks that are actually tested stay small ints.
+    """
+    rule_tags = set()
+    for rule in deconjugator_rules:
+        for key in ('con_tag', 'dec_tag'):
+            tags = rule.get(key)
+            rule_tags.update(t for t in (tags if isinstance(tags, list) else [tags]) if isinstance(t, str))
+    entry_tags = {p for senses in entries.values() for s in senses for p in s['pos']}
+    return sorted(rule_tags) + sorted(entry_tags - rule_tags)
+
+
+def pos_mask(pos_tags: Iterable[str], pos_bits: dict[str, int]) -> int:
+    mask = 0
+    for tag in pos_tags:
+        mask |= pos_bits.get(tag, 0)
+    return mask
+
+
+def add_pos_masks(entries: dict, lookup_map: dict, deconjugator_rules: list) -> list[str]:
+    """
+    Appends the POS bitmask of its entry (the union of the pos tags of all senses) to every
+    4-field map entry in `lookup_map`, in place. Returns the POS vocabulary to store as
+    'pos_vocab' next to the lookup_map.
+    """
+    pos_vocab = build_pos_vocab(entries, deconjugator_rules)
+    pos_bits = {tag: 1 << i for i, tag in enumerate(pos_vocab)}
+    masks = {entry_id: pos_mask((p for s in senses for p in s['pos']), pos_bits)
+             for entry_id, senses in entries.items()}
+    for surface, me_list in lookup_map.items():
+        lookup_map[surface] = [me[:POS_MASK_INDEX] + (masks.get(me[ENTRY_ID_INDEX], 0),) for me in me_list]
+    return pos_vocab
+
+
+# Segments are dictionaries appended with 'meikipop import-yomitan-dict-* --append' instead of
+# replacing the main dictionary. They live in <dictionary>.segments/ next to the main pickle and
+# are listed, in load order, in its manifest.json. Segment n owns the entry IDs
+# [n * SEGMENT_ID_STRIDE, (n + 1) * SEGMENT_ID_STRIDE); the main dictionary stays below the first.
+SEGMENT_ID_STRIDE = 1_000_000_000
+SEGMENT_MANIFEST = 'manifest.json'
+
+
+def segment_dir(dict_path: str) -> str:
+    return os.path.splitext(dict_path)[0] + '.segments'
+
+
+def load_segment_manifest(dict_path: str) -> list[dict]:
+    """The manifest entries ({number, name, file, priority, ...}) of the segments of `dict_path`."""
+    path = os.path.join(segment_dir(dict_path), SEGMENT_MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('segments', [])
+
+
+def segment_number_for(dict_path: str, name: str) -> int:
+    """The number of the segment called `name` if it exists (it will be replaced), else the next free one."""
+    segments = load_segment_manifest(dict_path)
+    for segment in segments:
+        if segment['name'] == name:
+            return segment['number']
+    return max((segment['number'] for segment in segments), default=0) + 1
+
+
+def save_segment(dict_path: str, number: int, name: str, payload: dict, priority: float = 0.0, **info):
+    """
+    Writes a segment pickle (same payload layout as the main dictionary) and adds or replaces its
+    manifest entry. `priority` is added to the priority of every lookup result from the segment.
+    """
+    directory = segment_dir(dict_path)
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"segment_{number}_{re.sub(r'[^A-Za-z0-9_-]+', '_', name)[:40]}.pkl"
+    with open(os.path.join(directory, file_name + '.tmp'), 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(os.path.join(directory, file_name + '.tmp'), os.path.join(directory, file_name))
+
+    segments = [s for s in load_segment_manifest(dict_path) if s['number'] != number]
+    for stale in {s['file'] for s in load_segment_manifest(dict_path) if s['number'] == number} - {file_name}:
+        if os.path.exists(os.path.join(directory, stale)):
+            os.remove(os.path.join(directory, stale))
+    segments.append({'number': number, 'name': name, 'file': file_name, 'priority': priority, **info})
+    segments.sort(key=lambda s: s['number'])
+    with open(os.path.join(directory, SEGMENT_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({'segments': segments}, f, ensure_ascii=False, indent=2)
+
 
 class Dictionary:
     def __init__(self):
         # Core entries: {entry_id: [sense, ...]}
-        # Each sense: {'glosses': [...], 'pos': [...], 'misc': [...]}
+        # Each sense: Sense(glosses, pos, tags), stored as {'glosses': ..., 'pos': ..., 'tags': ...} in the pickle
         self.entries: dict[int, list] = {}
 
         # lookup_map: surface_form → [(written_form, reading_or_None, freq, entry_id), ...]
@@ -36,32 +200,61 @@ class Dictionary:
         # Deconjugation rules consumed by Deconjugator at runtime
         self.deconjugator_rules: list[dict] = []
 
+        # POS tag vocabulary: bit i of a map entry's pos_mask stands for pos_vocab[i]
+        self.pos_vocab: list[str] = []
+        self.pos_bits: dict[str, int] = {}
+
+        # DICT_FORMAT_VERSION the loaded pickle was written with
+        self.format_version = DICT_FORMAT_VERSION
+
+        # manifest entries of the loaded segments, see save_segment()
+        self.segments: list[dict] = []
+        self._segment_priorities: dict[int, float] = {}
+
         self._is_loaded = False
+        self._file_path = None
+        self._content_stamp = None
+        self._content_hash = None
 
-    def load_dictionary(self, file_path: str) -> bool:
+    def load_dictionary(self, file_path: str, progress_callback: Optional[ProgressCallback] = None) -> bool:
         if self._is_loaded:
             return True
+        report = progress_callback or (lambda message, fraction: None)
         logger.info(f"Loading dictionary from '{file_path}'")
+        report("Loading dictionary", None)
         start = time.perf_counter()
         try:
             with open(file_path, 'rb') as f:
                 data = pickle.load(f)
+            format_version = data.get('format_version', 1)
+            if format_version > DICT_FORMAT_VERSION:
+                logger.error(f"Dictionary format {format_version} is newer than this version of meikipop "
+                             f"supports ({DICT_FORMAT_VERSION}). Please update meikipop or rebuild the dictionary.")
+                return False
+            self.format_version     = format_version
             self.entries            = data['entries']
+            wrap_senses(self.entries)
             self.lookup_map         = data['lookup_map']
             self.kanji_entries      = data.get('kanji_entries', {})
             self.deconjugator_rules = data.get('deconjugator_rules', [])
+            self.pos_vocab          = data.get('pos_vocab', [])
+            self.pos_bits           = {tag: 1 << i for i, tag in enumerate(self.pos_vocab)}
             self._is_loaded = True
+            self._file_path = file_path
+            self._load_segments(file_path)
+            self.content_stamp()  # taken now, while the files on disk are the ones that were loaded
             n_refs = sum(len(v) for v in self.lookup_map.values())
             logger.info(
                 f"Dictionary loaded in {time.perf_counter() - start:.2f}s"
-                f"({len(self.entries)} core entries, {n_refs} lookup refs)"
+                f"({len(self.entries)} core entries, {n_refs} lookup refs"
+                + (f", {len(self.segments)} segment(s))" if self.segments else ")")
             )
             self._validate()
             return True
         except FileNotFoundError:
             logger.warning(f"Dictionary file not found. Trying download...")
-            if self._download_dictionary():
-                return self.load_dictionary(file_path)  # retry once after download
+            if self._download_dictionary(report):
+                return self.load_dictionary(file_path, progress_callback)  # retry once after download
             logger.error(
                 "Dictionary could not be downloaded. "
                 "You can build it manually by running 'meikipop build-dict'."
@@ -71,11 +264,127 @@ class Dictionary:
             logger.error(f"Failed to load dictionary: {e}")
             return False
 
-    def _download_dictionary(self) -> bool:
+    def _load_segments(self, file_path: str):
+        """Merges the appended segments of `file_path` into the loaded dictionary. A broken segment is skipped."""
+        try:
+            manifest = load_segment_manifest(file_path)
+        except Exception as e:
+            logger.error(f"Failed to read the dictionary segment manifest: {e}")
+            return
+        for segment in manifest:
+            try:
+                with open(os.path.join(segment_dir(file_path), segment['file']), 'rb') as f:
+                    data = pickle.load(f)
+                self._merge_segment(data)
+            except Exception as e:
+                logger.error(f"Failed to load dictionary segment '{segment.get('name')}': {e}")
+                continue
+            self.segments.append(segment)
+            self._segment_priorities[segment['number']] = float(segment.get('priority', 0.0))
+            logger.info(f"Loaded dictionary segment '{segment['name']}' ({len(data['entries'])} entries)")
+
+    def _merge_segment(self, data: dict):
+        segment_version = data.get('format_version', 1)
+        if segment_version > DICT_FORMAT_VERSION:
+            raise ValueError(f"segment format {segment_version} is newer than supported ({DICT_FORMAT_VERSION})")
+        segment_has_masks = segment_version >= POS_MASK_FORMAT_VERSION
+        if self.has_pos_masks():
+            # the segment's masks refer to its own vocabulary: move them onto ours, adding unknown tags
+            bit_map = []
+            for tag in data.get('pos_vocab', []):
+                if tag not in self.pos_bits:
+                    self.pos_bits[tag] = 1 << len(self.pos_vocab)
+                    self.pos_vocab.append(tag)
+                bit_map.append(self.pos_bits[tag])
+            remapped: dict[int, int] = {}
+
+            def convert(me):
+                mask = me[POS_MASK_INDEX] if segment_has_masks else 0
+                if mask not in remapped:
+                    remapped[mask] = sum(bit for i, bit in enumerate(bit_map) if mask >> i & 1)
+                return me[:POS_MASK_INDEX] + (remapped[mask],)
+        else:
+            def convert(me):
+                return me[:POS_MASK_INDEX]
+
+        wrap_senses(data['entries'])
+        self.entries.update(data['entries'])
+        for surface, me_list in data['lookup_map'].items():
+            self.lookup_map.setdefault(surface, []).extend(convert(me) for me in me_list)
+        for character, kanji_entry in data.get('kanji_entries', {}).items():
+            self.kanji_entries.setdefault(character, kanji_entry)
+
+    def segment_priority(self, entry_id: int) -> float:
+        """The priority adjustment of the segment `entry_id` belongs to (0 for the main dictionary)."""
+        if not self._segment_priorities:
+            return 0.0
+        return self._segment_priorities.get(entry_id // SEGMENT_ID_STRIDE, 0.0)
+
+    def has_pos_masks(self) -> bool:
+        """False for dictionaries built before map entries carried a pos_mask (format version 1)."""
+        return self.format_version >= POS_MASK_FORMAT_VERSION
+
+    def content_stamp(self) -> str:
+        """
+        Size and modification time of the loaded dictionary file and its segments. Much cheaper than
+        content_hash(), so derived data is matched against it first (see is_same_build()).
+        """
+        if self._content_stamp is None and self._file_path:
+            stats = []
+            for path in self._content_files():
+                stat = os.stat(path)
+                stats.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+            self._content_stamp = hashlib.sha1(json.dumps([stats, self.segments], sort_keys=True).encode()).hexdigest()
+        return self._content_stamp or ''
+
+    def content_hash(self) -> str:
+        """
+        SHA-1 of the loaded dictionary file and its segments. Used to tie derived data
+        (e.g. the lookup cache snapshot) to one specific build. Computed on first use,
+        since hashing a large file is not free.
+        """
+        if self._content_hash is None and self._file_path:
+            digest = hashlib.sha1()
+            for path in self._content_files():
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+            digest.update(json.dumps(self.segments, sort_keys=True).encode())
+            self._content_hash = digest.hexdigest()
+        return self._content_hash or ''
+
+    def is_same_build(self, stamp: str, content_hash: str) -> bool:
+        """
+        True if a content_stamp() and content_hash() saved with derived data belong to the loaded dictionary.
+        The files are only hashed when the stamp differs (e.g. after they were copied), and a matching stamp
+        adopts the saved hash, so the derived data can be saved again without hashing either.
+        """
+        if stamp and stamp == self.content_stamp():
+            if content_hash and self._content_hash is None:
+                self._content_hash = content_hash
+            return True
+        return bool(content_hash) and content_hash == self.content_hash()
+
+    def _content_files(self) -> list[str]:
+        return [self._file_path] + [os.path.join(segment_dir(self._file_path), s['file']) for s in self.segments]
+
+    def _download_dictionary(self, report: ProgressCallback) -> bool:
         try:
             with urllib.request.urlopen(DICT_URL) as response:
-                data = response.read()
-            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                total = int(response.headers.get('Content-Length') or 0)
+                buffer = io.BytesIO()
+                last_percent = -1
+                while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+                    buffer.write(chunk)
+                    done = buffer.tell()
+                    fraction = done / total if total else None
+                    percent = int(fraction * 100) if fraction is not None else done // 1_048_576
+                    if percent != last_percent:
+                        last_percent = percent
+                        report("Downloading dictionary", fraction)
+                        logger.debug(f"Downloaded {done // 1024} KB" + (f" of {total // 1024} KB" if total else ""))
+            report("Extracting dictionary", None)
+            with zipfile.ZipFile(buffer) as zf:
                 zf.extract("dictionary.pkl", path=paths.data_dir)
             logger.info("Dictionary downloaded successfully.")
             return True
@@ -90,29 +399,31 @@ class Dictionary:
         for any violations found. Never raises — validation is advisory only.
 
         Invariants checked:
-          - Every map entry tuple has exactly 4 elements
+          - Every map entry tuple has 5 elements (4 in format version 1)
           - written_form is a non-empty str or None (None is valid for kana-only)
           - reading is a str or None
           - freq is an int
+          - pos_mask is an int
           - entry_id exists in self.entries
           - A map entry reached via a kanji-containing key must not have
             written_form=None (that would render as an invisible entry)
         """
         issues = 0
         missing_entry_ids = set()
+        expected_fields = POS_MASK_INDEX + 1 if self.has_pos_masks() else POS_MASK_INDEX
 
         for surface, me_list in self.lookup_map.items():
             surface_has_kanji = any(0x4E00 <= ord(c) <= 0x9FFF for c in surface)
             for me in me_list:
-                if len(me) != 4:
+                if len(me) != expected_fields:
                     logger.warning(
                         f"Malformed map entry under key '{surface}': "
-                        f"expected 4 fields, got {len(me)} — {me!r}"
+                        f"expected {expected_fields} fields, got {len(me)} — {me!r}"
                     )
                     issues += 1
                     continue
 
-                wf, rd, freq, entry_id = me
+                wf, rd, freq, entry_id = me[:POS_MASK_INDEX]
 
                 if wf is not None and not isinstance(wf, str):
                     logger.warning(
@@ -135,6 +446,13 @@ class Dictionary:
                     )
                     issues += 1
 
+                if expected_fields > POS_MASK_INDEX and not isinstance(me[POS_MASK_INDEX], int):
+                    logger.warning(
+                        f"Map entry under '{surface}': pos_mask is {type(me[POS_MASK_INDEX]).__name__} "
+                        f"(expected int) — entry_id={entry_id}"
+                    )
+                    issues += 1
+
                 if surface_has_kanji and wf is None:
                     logger.warning(
                         f"Map entry under kanji key '{surface}' has written_form=None "
@@ -3,13 +3,16 @@ import logging
 import math
 import re
 import threading
-from collections import OrderedDict
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
 
 from meikipop.config.config import config, MAX_DICT_ENTRIES, DICT_PATH
-from meikipop.dictionary.customdict import Dictionary, WRITTEN_FORM_INDEX, READING_INDEX, FREQUENCY_INDEX, ENTRY_ID_INDEX, DEFAULT_FREQ
+from meikipop.dictionary.customdict import Dictionary, Sense, WRITTEN_FORM_INDEX, READING_INDEX, FREQUENCY_INDEX, ENTRY_ID_INDEX, POS_MASK_INDEX, DEFAULT_FREQ
 from meikipop.dictionary.deconjugator import Deconjugator, Form
+from meikipop.dictionary.lookup_cache import LookupCache
+from meikipop.utils.paths import paths
+from meikipop.utils.tracing import pipeline_metrics
 
 KANJI_REGEX = re.compile(r'[\u4e00-\u9faf]')
 JAPANESE_SEPARATORS = {
@@ -19,6 +22,9 @@ JAPANESE_SEPARATORS = {
     "．", "～", "―", "!", "?",
 }
 
+# number of most frequent lookups persisted across sessions to warm up the cache
+WARM_CACHE_SIZE = 2000
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,6 +37,7 @@ class DictionaryEntry:
     freq: int
     deconjugation_process: tuple
     priority: float = 0.0
+    match_len: int = 0
 
 
 @dataclass
@@ -42,65 +49,75 @@ class KanjiEntry:
     examples: List[Dict[str, str]]
 
 
-class Lookup(threading.Thread):
-    def __init__(self, shared_state, popup_window):
-        super().__init__(daemon=True, name="Lookup")
-        self.shared_state = shared_state
-        self.popup_window = popup_window
-        self.last_hit_result = None
-
-        self.dictionary = Dictionary()
-        self.lookup_cache: OrderedDict = OrderedDict()
-        self.CACHE_SIZE = 500
-
-        if not self.dictionary.load_dictionary(DICT_PATH):
-            raise RuntimeError("Failed to load dictionary.")
-        self.deconjugator = Deconjugator(self.dictionary.deconjugator_rules)
+def entry_to_dict(entry) -> dict:
+    """JSON-serializable form of a DictionaryEntry or KanjiEntry, tagged with its 'type' ('word' or 'kanji')."""
+    data = {'type': 'word' if isinstance(entry, DictionaryEntry) else 'kanji'}
+    data.update(asdict(entry))
+    if 'senses' in data:
+        # asdict() keeps Sense tuples as tuples, which would serialize as plain lists
+        data['senses'] = [s._asdict() if isinstance(s, Sense) else s for s in data['senses']]
+    return data
 
-    def clear_cache(self):
-        self.lookup_cache = OrderedDict()
 
-    def run(self):
-        logger.debug("Lookup thread started.")
-        while self.shared_state.running:
-            try:
-                hit_result = self.shared_state.lookup_queue.get()
-                if not self.shared_state.running: break
-                logger.debug("Lookup: Triggered")
+class LookupEngine:
+    """
+    The dictionary search without any threading or GUI: loads the dictionary and deconjugation
+    rules and answers lookups through an LRU cache. Used by the Lookup thread of the GUI as well
+    as by headless tools like 'meikipop serve'.
+    """
 
-                # skip lookup if hit_result didnt change
-                if hit_result == self.last_hit_result:
-                    continue
-                self.last_hit_result = hit_result
+    def __init__(self, cache_size_bytes: Optional[int] = None):
+        self.dictionary = Dictionary()
+        self.deconjugator = None
+        if cache_size_bytes is None:
+            cache_size_bytes = config.lookup_cache_size_kb * 1024
+        self.lookup_cache = LookupCache(cache_size_bytes)
+
+    def load(self, file_path: str = DICT_PATH, progress_callback=None) -> bool:
+        if not self.dictionary.load_dictionary(file_path, progress_callback):
+            return False
+        self.deconjugator = Deconjugator(self.dictionary.deconjugator_rules)
+        return True
 
-                lookup_result = self.lookup(self.last_hit_result) if self.last_hit_result else None
-                self.popup_window.set_latest_data(lookup_result)
-            except:
-                logger.exception("An unexpected error occurred in the lookup loop. Continuing...")
-        logger.debug("Lookup thread stopped.")
+    @property
+    def is_loaded(self) -> bool:
+        return self.deconjugator is not None
 
-    def lookup(self, lookup_string: str) -> List:
+    def lookup(self, lookup_string: str, max_length: Optional[int] = None,
+               include_kanji: Optional[bool] = None) -> List:
+        """DictionaryEntry results for the start of `lookup_string`, followed by a KanjiEntry if applicable."""
         if not lookup_string:
             return []
-        logger.info(f"Looking up: {lookup_string}")  # keep at info level so people know whats up
+        text = self.prepare_text(lookup_string, max_length)
+        if not text:
+            return []
+        return self.lookup_prepared(text, include_kanji)
 
+    def prepare_text(self, lookup_string: str, max_length: Optional[int] = None) -> str:
+        """Strips `lookup_string`, cuts it to `max_length` (default: max_lookup_length) and at the first separator."""
         text = lookup_string.strip()
-        text = text[:config.max_lookup_length]
+        text = text[:max_length or config.max_lookup_length]
         for i, ch in enumerate(text):
             if ch in JAPANESE_SEPARATORS:
                 text = text[:i]
                 break
-        if not text:
-            return []
-
-        if text in self.lookup_cache:
-            self.lookup_cache.move_to_end(text)
-            return self.lookup_cache[text]
+        return text
 
-        results = self._do_lookup(text)
+    def lookup_prepared(self, text: str, include_kanji: Optional[bool] = None, count: bool = True) -> List:
+        """
+        Looks up text that went through prepare_text(). `include_kanji` defaults to the show_kanji setting.
+        count=False keeps speculative lookups (prefetching, cache warm-up) out of the cache statistics.
+        """
+        words = self.lookup_cache.get(text, count)
+        if words is None:
+            words = self._do_lookup(text)
+            self.lookup_cache.put(text, self._cache_key(text, words), words, count)
+        results = list(words)
 
         # Append kanji entry for the first character if applicable
-        if config.show_kanji and KANJI_REGEX.match(text[0]):
+        if include_kanji is None:
+            include_kanji = config.show_kanji
+        if include_kanji and KANJI_REGEX.match(text[0]):
             kd = self.dictionary.kanji_entries.get(text[0])
             if kd:
                 results.append(KanjiEntry(
@@ -110,12 +127,19 @@ class Lookup(threading.Thread):
                     components=kd.get('components', []),
                     examples=kd.get('examples', []),
                 ))
-
-        self.lookup_cache[text] = results
-        if len(self.lookup_cache) > self.CACHE_SIZE:
-            self.lookup_cache.popitem(last=False)
         return results
 
+    @staticmethod
+    def _cache_key(text: str, words: List['DictionaryEntry']) -> tuple:
+        """
+        Normalized cache key: the longest matched prefix of `text` and whether `text`
+        contains kanji (which affects priorities). Characters after the longest match
+        never change the result. Results are sorted by match_len, so the first one
+        carries the longest match.
+        """
+        match_len = words[0].match_len if words else 1
+        return text[:match_len], bool(KANJI_REGEX.search(text))
+
     def _do_lookup(self, text: str) -> List[DictionaryEntry]:
         """
         Scan all prefixes of `text` (longest first), deconjugate each, then
@@ -125,13 +149,22 @@ class Lookup(threading.Thread):
         map entries that resolve to the same display pair. The final list is
         sorted by (match_length DESC, priority DESC).
         """
-        # entry_id -> (map_entry, form, match_len)
-        collected: Dict[int, Tuple[tuple, Form, int]] = {}
+        # entry_id -> (map_entry, form, match_len, senses)
+        collected: Dict[int, Tuple[tuple, Form, int, list]] = {}
         found_primary_match = False
+        text_has_kanji = bool(KANJI_REGEX.search(text))
+        use_pos_masks = self.dictionary.has_pos_masks()
 
         for prefix_len in range(len(text), 0, -1):
             prefix = text[:prefix_len]
 
+            # No longer prefix matched, so if this prefix was already cached as the longest
+            # match of an earlier lookup, the rest of the scan would produce the same result.
+            if not found_primary_match:
+                cached = self.lookup_cache.get_normalized((prefix, text_has_kanji))
+                if cached is not None:
+                    return cached
+
             forms = self.deconjugator.deconjugate(prefix)
             forms.add(Form(text=prefix))
 
@@ -142,6 +175,12 @@ class Lookup(threading.Thread):
                 if not map_entries:
                     continue
 
+                # POS validation: if the deconjugator tagged this form,
+                # the entry must contain that part-of-speech.
+                required_pos = form.tags[-1] if form.tags else None
+                # a tag outside the vocabulary has bit 0, which no entry matches
+                required_pos_bit = self.dictionary.pos_bits.get(required_pos, 0) if required_pos else 0
+
                 for map_entry in map_entries:
                     written = map_entry[WRITTEN_FORM_INDEX]
                     entry_id = map_entry[ENTRY_ID_INDEX]
@@ -150,18 +189,20 @@ class Lookup(threading.Thread):
                         logger.warning(f"Skipping malformed dictionary entry: kanji key '{form.text}'")
                         continue
 
-                    # POS validation: if the deconjugator tagged this form,
-                    # the entry must contain that part-of-speech.
-                    if form.tags:
-                        required_pos = form.tags[-1]
-                        entry_senses = self.dictionary.entries.get(entry_id, [])
-                        all_pos = {p for s in entry_senses for p in s['pos']}
-                        if required_pos not in all_pos:
-                            logger.debug(
-                                f"Pruning id={entry_id} ({written}): "
-                                f"required POS '{required_pos}' not in {all_pos}"
-                            )
-                            continue
+                    entry_senses = None  # fetched at most once per map entry, see below
+                    if required_pos:
+                        if use_pos_masks:
+                            if not map_entry[POS_MASK_INDEX] & required_pos_bit:
+                                continue
+                        else:
+                            entry_senses = self.dictionary.entries.get(entry_id, [])
+                            all_pos = {p for s in entry_senses for p in s['pos']}
+                            if required_pos not in all_pos:
+                                logger.debug(
+                                    f"Pruning id={entry_id} ({written}): "
+                                    f"required POS '{required_pos}' not in {all_pos}"
+                                )
+                                continue
 
                     # Kana-only prefix filter: once a primary match with kanji
                     # exists, suppress kana-path entries that have a kanji form
@@ -169,16 +210,18 @@ class Lookup(threading.Thread):
                         if written and KANJI_REGEX.search(written):
                             continue
 
-                    prefix_hits.append((map_entry, form))
+                    prefix_hits.append((map_entry, form, entry_senses))
 
             if prefix_hits:
                 if not found_primary_match:
                     found_primary_match = True
 
-                for map_entry, form in prefix_hits:
+                for map_entry, form, entry_senses in prefix_hits:
                     entry_id = map_entry[ENTRY_ID_INDEX]
                     if entry_id not in collected:
-                        collected[entry_id] = (map_entry, form, prefix_len)
+                        if entry_senses is None:
+                            entry_senses = self.dictionary.entries.get(entry_id, [])
+                        collected[entry_id] = (map_entry, form, prefix_len, entry_senses)
 
         return self._format_and_sort(list(collected.values()), text)
 
@@ -204,7 +247,7 @@ class Lookup(threading.Thread):
 
     def _format_and_sort(
         self,
-        raw: List[Tuple[tuple, Form, int]],
+        raw: List[Tuple[tuple, Form, int, list]],
         original_lookup: str,
     ) -> List[DictionaryEntry]:
         """
@@ -214,14 +257,14 @@ class Lookup(threading.Thread):
         # Key: (written_form, reading)  Value: accumulated data dict
         merged: Dict[Tuple[str, str], dict] = {}
 
-        for map_entry, form, match_len in raw:
+        for map_entry, form, match_len, entry_senses in raw:
             written  = map_entry[WRITTEN_FORM_INDEX]
             reading  = map_entry[READING_INDEX] or ''
             freq     = map_entry[FREQUENCY_INDEX]
             entry_id = map_entry[ENTRY_ID_INDEX]
 
-            entry_senses = self.dictionary.entries.get(entry_id, [])
-            priority     = self._calculate_priority(written, freq, form, match_len, original_lookup)
+            priority     = (self._calculate_priority(written, freq, form, match_len, original_lookup)
+                            + self.dictionary.segment_priority(entry_id))
 
             key = (written, reading)
             if key not in merged:
@@ -267,6 +310,7 @@ class Lookup(threading.Thread):
                 freq=d['freq'],
                 deconjugation_process=d['deconjugation_process'],
                 priority=d['priority'],
+                match_len=d['match_len'],
             ))
         return results
 
@@ -315,3 +359,166 @@ class Lookup(threading.Thread):
             elif code == 0x30FE:           res.append('\u309E')  # ヾ → ゞ
             else:                          res.append(c)
         return ''.join(res)
+
+
+class Lookup(threading.Thread):
+    def __init__(self, shared_state, popup_window, dictionary_path: str = DICT_PATH, warm_up_cache: bool = True):
+        super().__init__(daemon=True, name="Lookup")
+        self.shared_state = shared_state
+        self.popup_window = popup_window
+        self.last_hit_result = None
+        self.dictionary_path = dictionary_path
+        self.warm_up_cache = warm_up_cache
+
+        self.engine = LookupEngine()
+
+        # loading (and possibly downloading) the dictionary happens in the background, so the
+        # tray, ocr and hit scanning can start right away. lookups wait for dictionary_ready.
+        self.dictionary_ready = threading.Event()
+        self.load_failed = False
+        self.load_status = "Loading dictionary"
+        self.load_progress = None
+        threading.Thread(target=self._load_dictionary, daemon=True, name="DictionaryLoader").start()
+
+    def _load_dictionary(self):
+        try:
+            loaded = self.engine.load(self.dictionary_path, self._report_load_progress)
+        except Exception:
+            logger.exception("Unexpected error while loading the dictionary.")
+            loaded = False
+
+        if not loaded:
+            logger.critical("Failed to load dictionary.")
+            self.load_status = "Failed to load dictionary"
+            self.load_failed = True
+            return
+        self.load_status = "Dictionary ready"
+        self.load_progress = 1.0
+        self.dictionary_ready.set()
+        if self.warm_up_cache:
+            self._warm_up_cache()
+
+    def _report_load_progress(self, message: str, fraction):
+        self.load_status = message
+        self.load_progress = fraction
+
+    @property
+    def dictionary(self) -> Dictionary:
+        return self.engine.dictionary
+
+    @property
+    def lookup_cache(self) -> LookupCache:
+        return self.engine.lookup_cache
+
+    def wait_until_ready(self, timeout=None) -> bool:
+        return self.dictionary_ready.wait(timeout)
+
+    def clear_cache(self):
+        self.lookup_cache.clear()
+
+    def reapply_settings(self):
+        # cached results do not depend on display settings (see LookupCache), so only force the
+        # current hit to be re-published instead of invalidating anything
+        self.last_hit_result = None
+        self.lookup_cache.resize(config.lookup_cache_size_kb * 1024)
+
+    def save_cache_snapshot(self):
+        if not self.dictionary_ready.is_set():
+            return
+        try:
+            self.lookup_cache.save_snapshot(paths.lookup_cache_path, self.dictionary.content_stamp(),
+                                            self.dictionary.content_hash(), WARM_CACHE_SIZE)
+        except Exception as e:
+            logger.warning(f"Could not save lookup cache snapshot: {e}")
+
+    def _warm_up_cache(self):
+        """
+        Replays the lookups saved by the previous session. Runs on the loader thread once the
+        dictionary is ready and yields to real lookups whenever one is pending.
+        """
+        try:
+            texts = LookupCache.load_snapshot(paths.lookup_cache_path, self.dictionary.is_same_build)
+            if not texts:
+                return
+            start = time.perf_counter()
+            replayed = 0
+            for text in texts:
+                while self.shared_state.running and self.shared_state.lookup_queue.has_pending():
+                    time.sleep(0.05)
+                if not self.shared_state.running:
+                    return
+                if text not in self.lookup_cache:
+                    self.engine.lookup_prepared(text, count=False)
+                    replayed += 1
+                time.sleep(0)  # let the lookup thread grab the GIL between replayed lookups
+            logger.info(f"Warmed up lookup cache with {replayed} lookups from the last session "
+                        f"in {time.perf_counter() - start:.2f}s.")
+        except Exception:
+            logger.exception("Failed to warm up the lookup cache.")
+
+    def run(self):
+        logger.debug("Lookup thread started.")
+        # requests arriving in the meantime are kept by lookup_queue and served once the dictionary is ready
+        while self.shared_state.running and not self.wait_until_ready(0.1):
+            if self.load_failed:
+                logger.debug("Lookup thread stopped.")
+                return
+        while self.shared_state.running:
+            try:
+                hit_result, trace_context = self.shared_state.lookup_queue.get_with_context()
+                if not self.shared_state.running: break
+                logger.debug("Lookup: Triggered")
+
+                # skip lookup if hit_result didnt change
+                if hit_result == self.last_hit_result:
+                    continue
+                self.last_hit_result = hit_result
+
+                with pipeline_metrics.span('lookup', trace_context):
+                    lookup_result = self.lookup(hit_result.lookup_string) if hit_result else None
+                self.popup_window.set_latest_data(lookup_result, trace_context)
+
+                if hit_result and lookup_result:
+                    with pipeline_metrics.trace('prefetch'):
+                        self.prefetch_neighbours(hit_result, lookup_result)
+            except:
+                logger.exception("An unexpected error occurred in the lookup loop. Continuing...")
+        logger.debug("Lookup thread stopped.")
+
+    def prefetch_neighbours(self, hit_result, primary_results: List):
+        """
+        Speculatively warm the cache for the characters around the one just looked up.
+        The cursor almost always moves on to i±1 or to the start of the next word, so
+        those lookups are computed while the thread would otherwise sit idle. Any
+        pending real request pre-empts the prefetcher between two lookups.
+        """
+        radius = config.lookup_prefetch_radius
+        if radius <= 0:
+            return
+        full_text, index = hit_result.full_text, hit_result.char_index
+
+        candidates = []
+        match_len = max((e.match_len for e in primary_results if isinstance(e, DictionaryEntry)), default=0)
+        if match_len:
+            candidates.append(index + match_len)  # the following word
+        for distance in range(1, radius + 1):
+            candidates.extend((index + distance, index - distance))
+
+        seen = {index}
+        for offset in candidates:
+            if offset in seen or not 0 <= offset < len(full_text):
+                continue
+            seen.add(offset)
+            if self.shared_state.lookup_queue.has_pending() or not self.shared_state.running:
+                logger.debug("Lookup: Prefetch pre-empted by a new request")
+                return
+            text = self.engine.prepare_text(full_text[offset:])
+            if text and text not in self.lookup_cache:
+                logger.debug(f"Lookup: Prefetching '{text}'")
+                self.engine.lookup_prepared(text, count=False)
+
+    def lookup(self, lookup_string: str) -> List:
+        if not lookup_string:
+            return []
+        logger.info(f"Looking up: {lookup_string}")  # keep at info level so people know whats up
+        return self.engine.lookup(lookup_string)
@@ -0,0 +1,205 @@
+# lookup_cache.py
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# raw lookup strings are short, so the alias table is bounded by count instead of bytes
+MAX_ALIASES = 8192
+# rough per-object overhead of a DictionaryEntry (object + __dict__) on 64-bit CPython
+ENTRY_OVERHEAD = 450
+STATS_LOG_INTERVAL = 500
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class LookupCache:
+    """
+    LRU cache for dictionary lookups, bounded by an estimate of its memory use.
+
+    Results are stored under a normalized key: the longest prefix of the lookup text
+    that produced any dictionary hit (plus whether the text contains kanji, which
+    influences ranking). Everything after that prefix never affects the result, so
+    「食べた」, 「食べた。」 and 「食べた彼は…」 all share one stored result. Raw lookup
+    strings are mapped to their normalized key through a small alias table.
+
+    The cache only holds dictionary results. Anything that depends on display
+    settings (e.g. the kanji entry) is assembled by the caller on every read, so
+    changing those settings never requires invalidation.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()  # normalized key -> (results, size)
+        self._aliases: OrderedDict = OrderedDict()  # raw text -> normalized key
+        self._alias_hits: Dict[str, int] = {}  # raw text -> number of times it was looked up
+        self._lock = threading.Lock()
+
+        self.size_bytes = 0
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, text: str) -> bool:
+        with self._lock:
+            key = self._aliases.get(text)
+            return key is not None and key in self._entries
+
+    def get(self, text: str, count: bool = True) -> Optional[List]:
+        """
+        Returns the cached results for a raw lookup string, or None. With count=False (lookups the user did
+        not ask for, like the cache warm-up) the hit/miss statistics and the snapshot frequencies are left alone.
+        """
+        with self._lock:
+            key = self._aliases.get(text)
+            if key is not None and key in self._entries:
+                self._aliases.move_to_end(text)
+                if count:
+                    self._alias_hits[text] = self._alias_hits.get(text, 0) + 1
+                    self.hits += 1
+                return self._touch(key)
+            if count:
+                self.misses += 1
+                self._maybe_log_stats()
+            return None
+
+    def get_normalized(self, key: Hashable) -> Optional[List]:
+        """Returns the cached results stored under a normalized key, or None. Does not count as a miss."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self.prefix_hits += 1
+            return self._touch(key)
+
+    def put(self, text: str, key: Hashable, results: List, count: bool = True):
+        with self._lock:
+            self._aliases[text] = key
+            self._aliases.move_to_end(text)
+            if count:
+                self._alias_hits[text] = self._alias_hits.get(text, 0) + 1
+            while len(self._aliases) > MAX_ALIASES:
+                old_text, _ = self._aliases.popitem(last=False)
+                self._alias_hits.pop(old_text, None)
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            size = self._estimate_size(key, results)
+            self._entries[key] = (results, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, (_, old_size) = self._entries.popitem(last=False)
+                self.size_bytes -= old_size
+                self.evictions += 1
+
+    def resize(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.size_bytes > self.max_bytes and self._entries:
+                old_key, (_, old_size) = self._entries.popitem(last=False)
+                self.size_bytes -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._alias_hits.clear()
+            self.size_bytes = 0
+
+    def most_frequent(self, limit: int) -> List[str]:
+        """Raw lookup strings that are still cached, most frequently looked up first."""
+        with self._lock:
+            texts = [t for t, key in self._aliases.items() if key in self._entries]
+            texts.sort(key=lambda t: self._alias_hits.get(t, 0), reverse=True)
+            return texts[:limit]
+
+    def save_snapshot(self, path: str, dictionary_stamp: str, dictionary_hash: str, limit: int):
+        """
+        Writes the most frequent lookup strings to `path`. Only the strings are stored;
+        results are recomputed on replay, so the snapshot stays small and can never
+        serve results from a different dictionary.
+        """
+        texts = self.most_frequent(limit)
+        snapshot = {'format': SNAPSHOT_FORMAT_VERSION, 'dictionary_stamp': dictionary_stamp,
+                    'dictionary_hash': dictionary_hash, 'lookups': texts}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(texts)} lookups for cache warm-up to '{path}'.")
+
+    @staticmethod
+    def load_snapshot(path: str, is_same_dictionary: Callable[[str, str], bool]) -> List[str]:
+        """
+        Returns the lookup strings saved by save_snapshot, or [] if missing or made for another dictionary.
+        `is_same_dictionary(stamp, hash)` tells whether the saved dictionary stamp and hash match the loaded one.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable lookup cache snapshot '{path}': {e}")
+            return []
+        if (snapshot.get('format') != SNAPSHOT_FORMAT_VERSION or
+                not is_same_dictionary(snapshot.get('dictionary_stamp', ''), snapshot.get('dictionary_hash', ''))):
+            logger.info("Lookup cache snapshot belongs to a different dictionary. Starting with a cold cache.")
+            return []
+        return [t for t in snapshot.get('lookups', []) if isinstance(t, str)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'aliases': len(self._aliases),
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'prefix_hits': self.prefix_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.prefix_hits) / lookups if lookups else 0.0,
+            }
+
+    def log_stats(self, level=logging.INFO):
+        s = self.stats()
+        logger.log(
+            level,
+            f"Lookup cache: {s['entries']} entries, {s['size_bytes'] / 1024:.0f}/{s['max_bytes'] / 1024:.0f} KB, "
+            f"hit rate {s['hit_rate']:.1%} ({s['hits']} hits, {s['prefix_hits']} prefix hits, "
+            f"{s['misses']} misses, {s['evictions']} evictions)"
+        )
+
+    def _touch(self, key: Hashable) -> List:
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def _maybe_log_stats(self):
+        if self.misses % STATS_LOG_INTERVAL == 0:
+            lookups = self.hits + self.misses
+            logger.debug(
+                f"Lookup cache: {len(self._entries)} entries, {self.size_bytes / 1024:.0f} KB, "
+                f"hit rate {(self.hits + self.prefix_hits) / lookups:.1%}, {self.evictions} evictions"
+            )
+
+    @staticmethod
+    def _estimate_size(key: Hashable, results: List) -> int:
+        # senses are shared with the loaded dictionary, so only the per-result containers are counted
+        size = sys.getsizeof(key) + sys.getsizeof(results)
+        for item in (key if isinstance(key, tuple) else ()):
+            size += sys.getsizeof(item)
+        for entry in results:
+            size += ENTRY_OVERHEAD + sys.getsizeof(getattr(entry, 'senses', ()))
+        return size
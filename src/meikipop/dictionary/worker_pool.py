@@ -0,0 +1,122 @@
+# worker_pool.py
+import gc
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+from meikipop.config.config import DICT_PATH
+from meikipop.dictionary.lookup import LookupEngine
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_IN_FLIGHT_PER_WORKER = 4
+DEFAULT_CHUNK_SIZE = 256
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# the engine of the current worker process. with the fork start method it is inherited from the parent
+# (see LookupWorkerPool), otherwise every worker loads its own copy in _init_worker.
+_worker_engine: Optional[LookupEngine] = None
+
+
+def _init_worker(dictionary_path: str):
+    global _worker_engine
+    if _worker_engine is not None:
+        return  # inherited from the parent process
+    _worker_engine = LookupEngine()
+    if not _worker_engine.load(dictionary_path):
+        raise RuntimeError(f"Failed to load dictionary '{dictionary_path}'")
+
+
+def _run_chunk(func: Callable, chunk):
+    return func(_worker_engine, chunk)
+
+
+def lookup_chunk(engine: LookupEngine, chunk: tuple) -> List[List]:
+    """Chunk function for LookupWorkerPool.lookup_many(): chunk is (texts, max_length, include_kanji)."""
+    texts, max_length, include_kanji = chunk
+    return [engine.lookup(text, max_length, include_kanji) for text in texts]
+
+
+class LookupWorkerPool:
+    """
+    A pool of processes that run dictionary lookups in parallel, for workloads that need many
+    lookups at once (batch annotation, large server batches). Results come back in submission order.
+
+    Where the 'fork' start method is available (Linux), the dictionary is loaded once in the parent and
+    the workers inherit it copy-on-write, so starting a worker neither unpickles the dictionary again nor
+    duplicates its memory. Elsewhere, every worker loads the dictionary file itself on startup.
+    """
+
+    def __init__(self, processes: Optional[int] = None, dictionary_path: str = DICT_PATH,
+                 engine: Optional[LookupEngine] = None):
+        global _worker_engine
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.shares_memory = sys.platform.startswith('linux') and 'fork' in multiprocessing.get_all_start_methods()
+
+        if self.shares_memory:
+            if engine is None:
+                engine = LookupEngine()
+                if not engine.load(dictionary_path):
+                    raise RuntimeError(f"Failed to load dictionary '{dictionary_path}'")
+            _worker_engine = engine
+            # move everything allocated so far out of the gc's reach, so collections in the workers
+            # don't write to (and thereby copy) the pages holding the dictionary
+            gc.freeze()
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context('spawn')
+
+        self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                             initializer=_init_worker, initargs=(dictionary_path,))
+        if self.shares_memory:
+            # with 'fork', the executor starts all of its workers on the first submit. do that now,
+            # while _worker_engine is still set, then drop the parent's reference again.
+            self._executor.submit(os.getpid).result()
+            _worker_engine = None
+            gc.unfreeze()
+        logger.info(f"Started {self.processes} lookup worker(s) "
+                    f"({'sharing the dictionary' if self.shares_memory else 'each loading the dictionary'}).")
+
+    def map_chunks(self, func: Callable[[LookupEngine, T], R], chunks: Iterable[T]) -> Iterator[R]:
+        """
+        Yields func(engine, chunk) for every chunk, in order. `func` must be a module-level function.
+        Chunks are consumed lazily with a bounded number in flight, so `chunks` may be a huge generator.
+        """
+        in_flight = []
+        max_in_flight = self.processes * CHUNKS_IN_FLIGHT_PER_WORKER
+        for chunk in chunks:
+            in_flight.append(self._executor.submit(_run_chunk, func, chunk))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.pop(0).result()
+        for future in in_flight:
+            yield future.result()
+
+    def lookup_many(self, texts: Iterable[str], max_length: Optional[int] = None,
+                    include_kanji: Optional[bool] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List]:
+        """Yields the lookup results (as returned by LookupEngine.lookup) for every text, in order."""
+        def chunks():
+            batch = []
+            for text in texts:
+                batch.append(text)
+                if len(batch) >= chunk_size:
+                    yield batch, max_length, include_kanji
+                    batch = []
+            if batch:
+                yield batch, max_length, include_kanji
+
+        for results in self.map_chunks(lookup_chunk, chunks()):
+            yield from results
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,17 +1,22 @@
 # meikipop/gui/input.py
 import logging
+import select
 import sys
 import threading
 import time
+from typing import NamedTuple, Tuple
 
 from pynput import mouse
 
-from meikipop.config.config import config, IS_LINUX, IS_MACOS
+from meikipop.config.config import config, IS_LINUX, IS_MACOS, IS_WAYLAND
+from meikipop.utils.session_recorder import session_recorder
+from meikipop.utils.tracing import TraceContext
 
 if IS_LINUX:
     from Xlib import display as xlib_display
     from Xlib.error import XError
     from Xlib import XK
+    from Xlib.ext import ge, xinput
 elif IS_MACOS:
     import Quartz
     from AppKit import NSEvent
@@ -134,7 +139,78 @@ class MacOSKeyboardController:
             logger.warning(f"Error checking hotkey state: {e}")
             return False
 
+class XInput2EventSource:
+    """
+    Blocks on X11 XInput2 raw motion/key events instead of polling.
+
+    Raw events are delivered for the whole screen regardless of which window has
+    focus, so we only wake up when the user actually moves the mouse or presses
+    a key. Raw motion carries no absolute coordinates, so the pointer is queried
+    once per batch of drained events.
+    """
+
+    def __init__(self):
+        self.display = xlib_display.Display()
+        if not self.display.has_extension('XInputExtension'):
+            self.display.close()
+            raise RuntimeError("XInputExtension not available")
+        version = self.display.xinput_query_version()
+        if (version.major_version, version.minor_version) < (2, 0):
+            self.display.close()
+            raise RuntimeError(f"XInput {version.major_version}.{version.minor_version} is too old, need 2.0+")
+        self.opcode = self.display.query_extension('XInputExtension').major_opcode
+        self.root = self.display.screen().root
+        self.root.xinput_select_events([
+            (xinput.AllMasterDevices,
+             xinput.RawMotionMask | xinput.RawKeyPressMask | xinput.RawKeyReleaseMask)
+        ])
+        self.display.flush()
+
+    def wait(self, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for events. Returns True if events are pending."""
+        if self.display.pending_events():
+            return True
+        readable, _, _ = select.select([self.display.fileno()], [], [], timeout)
+        return bool(readable)
+
+    def drain(self) -> Tuple[bool, bool]:
+        """Consumes all pending events and reports (mouse_moved, key_changed)."""
+        mouse_moved = key_changed = False
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if event.type != ge.GenericEventCode or event.extension != self.opcode:
+                continue
+            if event.evtype == xinput.RawMotion:
+                mouse_moved = True
+            elif event.evtype in (xinput.RawKeyPress, xinput.RawKeyRelease):
+                key_changed = True
+        return mouse_moved, key_changed
+
+    def pointer_position(self) -> Tuple[int, int]:
+        pointer = self.root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def close(self):
+        try:
+            self.display.close()
+        except Exception:
+            pass
+
+
+class InputSnapshot(NamedTuple):
+    """Immutable view of the input state. Replaced as a whole, so readers never need a lock."""
+    mouse_pos: Tuple[int, int]
+    hotkey_pressed: bool
+    timestamp: float
+
+
 class InputLoop(threading.Thread):
+    POLL_INTERVAL = 0.01
+    # upper bound for how long the event-driven loop sleeps without input, so config changes are picked up
+    EVENT_WAIT_TIMEOUT = 0.1
+
+    _query_controller = None
+
     def __init__(self, shared_state):
         super().__init__(daemon=True, name="InputLoop")
         self.shared_state = shared_state
@@ -149,55 +225,108 @@ class InputLoop(threading.Thread):
             self.keyboard_controller = WindowsKeyboardController(self.hotkey_str)
 
         self.started_auto_mode = False
+        self._last_mouse_pos = None
+        self._hotkey_was_pressed = False
+        self._hotkey_dirty = False
+        self.snapshot = InputSnapshot(self._to_int_pos(self.mouse_controller.position), False, time.perf_counter())
 
     def run(self):
         logger.debug("Input thread started.")
-        last_mouse_pos = (0, 0)
-        hotkey_was_pressed = False
+        event_source = None
+        if IS_LINUX and not IS_WAYLAND:
+            try:
+                event_source = XInput2EventSource()
+                logger.info("Input: Using XInput2 raw events.")
+            except Exception as e:
+                logger.warning(f"Input: XInput2 unavailable ({e}). Falling back to polling.")
+
+        if event_source:
+            try:
+                self._run_event_driven(event_source)
+            finally:
+                event_source.close()
+        else:
+            self._run_polling()
+        logger.debug("Input thread stopped.")
 
+    def _run_polling(self):
         while self.shared_state.running:
             if not config.is_enabled:
                 time.sleep(0.1)
                 continue
             try:
-                current_mouse_pos = self.mouse_controller.position
-                try:
-                    hotkey_is_pressed = self.keyboard_controller.is_hotkey_pressed()
-                except Exception:
-                    hotkey_is_pressed = False
-
-                # trigger screenshots + ocr in manual mode
-                if hotkey_is_pressed and not hotkey_was_pressed and not config.auto_scan_mode:
-                    logger.info(f"Input: Hotkey '{config.hotkey}' pressed. Triggering screenshot.")
-                    self.shared_state.screenshot_trigger_event.set()
-
-                # trigger initial screenshots + ocr in auto mode
-                if not self.started_auto_mode and config.auto_scan_mode:
-                    self.shared_state.screenshot_trigger_event.set()
-                self.started_auto_mode = config.auto_scan_mode
-
-                # trigger screenshots + ocr in auto-on-mouse-move mode
-                if config.auto_scan_mode and config.auto_scan_on_mouse_move and current_mouse_pos != last_mouse_pos:
-                    self.shared_state.screenshot_trigger_event.set()
-
-                # trigger hit_scans + lookups
-                if current_mouse_pos != last_mouse_pos:
-                    self.shared_state.hit_scan_queue.trigger()
-
-                if hotkey_was_pressed and not hotkey_is_pressed:
-                    logger.info(f"Input: Hotkey '{config.hotkey}' released.")
-
-                last_mouse_pos = current_mouse_pos
-                hotkey_was_pressed = hotkey_is_pressed
-                self.hotkey_is_pressed = hotkey_is_pressed
+                self._update(self.mouse_controller.position, self._query_hotkey())
             except:
                 logger.exception("An unexpected error occurred in the input loop. Continuing...")
             finally:
-                time.sleep(0.01)
-        logger.debug("Input thread stopped.")
+                time.sleep(self.POLL_INTERVAL)
+
+    def _run_event_driven(self, event_source: XInput2EventSource):
+        mouse_pos = event_source.pointer_position()
+        hotkey_is_pressed = self._query_hotkey()
+        while self.shared_state.running:
+            if not config.is_enabled:
+                time.sleep(0.1)
+                event_source.drain()  # discard whatever happened while paused
+                continue
+            try:
+                if event_source.wait(self.EVENT_WAIT_TIMEOUT):
+                    mouse_moved, key_changed = event_source.drain()
+                    if mouse_moved:
+                        mouse_pos = event_source.pointer_position()
+                    if key_changed or self._hotkey_dirty:
+                        hotkey_is_pressed = self._query_hotkey()
+                elif self._hotkey_dirty:
+                    hotkey_is_pressed = self._query_hotkey()
+                self._update(mouse_pos, hotkey_is_pressed)
+            except:
+                logger.exception("An unexpected error occurred in the input loop. Continuing...")
+                time.sleep(self.POLL_INTERVAL)
+
+    def _query_hotkey(self) -> bool:
+        self._hotkey_dirty = False
+        try:
+            return self.keyboard_controller.is_hotkey_pressed()
+        except Exception:
+            return False
+
+    def _update(self, raw_mouse_pos, hotkey_is_pressed: bool):
+        current_mouse_pos = self._to_int_pos(raw_mouse_pos)
+        mouse_moved = current_mouse_pos != self._last_mouse_pos
+        self.snapshot = InputSnapshot(current_mouse_pos, hotkey_is_pressed, time.perf_counter())
+        if mouse_moved or hotkey_is_pressed != self._hotkey_was_pressed:
+            session_recorder.record_input(current_mouse_pos, hotkey_is_pressed)
+
+        # trigger screenshots + ocr in manual mode
+        if hotkey_is_pressed and not self._hotkey_was_pressed and not config.auto_scan_mode:
+            logger.info(f"Input: Hotkey '{config.hotkey}' pressed. Triggering screenshot.")
+            self.shared_state.screenshot_trigger_event.set()
+
+        # trigger initial screenshots + ocr in auto mode
+        if not self.started_auto_mode and config.auto_scan_mode:
+            self.shared_state.screenshot_trigger_event.set()
+        self.started_auto_mode = config.auto_scan_mode
+
+        # trigger screenshots + ocr in auto-on-mouse-move mode
+        if config.auto_scan_mode and config.auto_scan_on_mouse_move and mouse_moved:
+            self.shared_state.screenshot_trigger_event.set()
+
+        # trigger hit_scans + lookups
+        if mouse_moved:
+            self.shared_state.hit_scan_queue.trigger(TraceContext('input'))
+
+        if self._hotkey_was_pressed and not hotkey_is_pressed:
+            logger.info(f"Input: Hotkey '{config.hotkey}' released.")
+
+        self._last_mouse_pos = current_mouse_pos
+        self._hotkey_was_pressed = hotkey_is_pressed
+
+    @property
+    def hotkey_is_pressed(self) -> bool:
+        return self.snapshot.hotkey_pressed
 
     def is_virtual_hotkey_down(self):
-        return self.keyboard_controller.is_hotkey_pressed() or (
+        return self.snapshot.hotkey_pressed or (
                 config.auto_scan_mode and config.auto_scan_mode_lookups_without_hotkey)
 
     def reapply_settings(self):
@@ -209,10 +338,20 @@ class InputLoop(threading.Thread):
             self.keyboard_controller = MacOSKeyboardController(self.hotkey_str)
         else: # IS_WINDOWS
             self.keyboard_controller = WindowsKeyboardController(self.hotkey_str)
+        self._hotkey_dirty = True
+
+    def get_mouse_pos(self):
+        """Latest cursor position as published by the input thread. Never blocks and never talks to the OS."""
+        return self.snapshot.mouse_pos
+
+    @classmethod
+    def query_mouse_pos(cls):
+        """Queries the OS for the cursor position directly. For use before/outside the input thread."""
+        if cls._query_controller is None:
+            cls._query_controller = mouse.Controller()
+        return cls._to_int_pos(cls._query_controller.position)
 
     @staticmethod
-    def get_mouse_pos():
-        with mouse.Controller() as mc:
-            pos = mc.position
-            # Convert floats to integers for QPoint compatibility
-            return (int(pos[0]), int(pos[1]))
+    def _to_int_pos(pos):
+        # Convert floats to integers for QPoint compatibility
+        return (int(pos[0]), int(pos[1]))
@@ -1,6 +1,7 @@
 # meikipop/gui/popup.py
 import logging
 import threading
+import time
 from typing import List, Optional
 
 from PyQt6.QtCore import QTimer, QPoint, QSize
@@ -11,6 +12,7 @@ from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QFrame, QApplication
 from meikipop.config.config import config, IS_MACOS
 from meikipop.dictionary.lookup import DictionaryEntry, KanjiEntry
 from meikipop.gui.magpie_manager import magpie_manager
+from meikipop.utils.tracing import pipeline_metrics
 
 # macOS-specific imports for focus management
 if IS_MACOS:
@@ -28,6 +30,8 @@ class Popup(QWidget):
         self._latest_data = None
         self._last_latest_data = None
         self._data_lock = threading.Lock()
+        self._trace_context = None
+        self._trace_context_time = 0.0
         self._previous_active_window_on_mac = None
 
         self.shared_state = shared_state
@@ -149,14 +153,23 @@ class Popup(QWidget):
 
         return best_fit if best_fit > 0 else 50
 
-    def set_latest_data(self, data):
+    def set_latest_data(self, data, trace_context=None):
         with self._data_lock:
             self._latest_data = data
+            if self._trace_context is not None:
+                pipeline_metrics.record_drop("popup")
+            self._trace_context = trace_context
+            self._trace_context_time = time.perf_counter()
 
     def get_latest_data(self):
         with self._data_lock:
             return self._latest_data
 
+    def _take_trace_context(self):
+        with self._data_lock:
+            trace_context, self._trace_context = self._trace_context, None
+            return trace_context, self._trace_context_time
+
     def process_latest_data_loop(self):
         if not self.is_calibrated:
             self._calibrate_empirically()
@@ -168,6 +181,7 @@ class Popup(QWidget):
             self.display_label.setText(full_html)
             self.setFixedSize(new_size)
         self._last_latest_data = latest_data
+        pipeline_metrics.finish(*self._take_trace_context())
 
         if self._latest_data and self.input_loop.is_virtual_hotkey_down() and config.is_enabled:
             self.show_popup()
@@ -422,7 +436,8 @@ class Popup(QWidget):
         if self.is_visible:
             return
         logger.debug("show_popup acquiring lock...")
-        self.shared_state.screen_lock.acquire()
+        with pipeline_metrics.trace('screen_lock wait'):
+            self.shared_state.screen_lock.acquire()
         logger.debug("...successfully acquired lock by show_popup")
 
         self._store_active_window_on_mac()
@@ -384,7 +384,6 @@ class SettingsDialog(QDialog):
         """Enables/Disables kanji specific sub-options."""
         self.show_examples_check.setEnabled(is_checked)
         self.show_components_check.setEnabled(is_checked)
-        self.lookup.clear_cache()
 
     def _mark_as_custom(self):
         if self.theme_combo.currentText() != "Custom":
@@ -451,6 +450,7 @@ class SettingsDialog(QDialog):
 
         # Tell the live components to re-apply settings
         self.input_loop.reapply_settings()
+        self.lookup.reapply_settings()
         self.popup_window.reapply_settings()
         self.tray_icon.reapply_settings()
         self.ocr_processor.shared_state.screenshot_trigger_event.set()
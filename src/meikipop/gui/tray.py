@@ -1,6 +1,7 @@
 # meikipop/gui/tray.py
 import os
 
+from PyQt6.QtCore import QTimer
 from PyQt6.QtGui import QIcon, QAction, QActionGroup
 from PyQt6.QtWidgets import QSystemTrayIcon, QMenu, QApplication
 
@@ -112,6 +113,38 @@ class TrayIcon(QSystemTrayIcon):
 
         self.show()
 
+        # the dictionary and the ocr provider load in the background, show their progress until both are ready
+        self.loading_status_timer = QTimer(self)
+        self.loading_status_timer.timeout.connect(self._update_loading_status)
+        self.loading_status_timer.start(200)
+        self._update_loading_status()
+
+    def _update_loading_status(self):
+        if self.lookup.load_failed:
+            self.loading_status_timer.stop()
+            self.setToolTip(f"{APP_NAME} - {self.lookup.load_status}")
+            self.showMessage(APP_NAME, "Failed to load dictionary. You can build it manually by running "
+                                       "'meikipop build-dict'.", QSystemTrayIcon.MessageIcon.Critical)
+            QTimer.singleShot(3000, lambda: QApplication.instance().exit(1))
+            return
+        if self.ocr_processor.load_failed:
+            self.loading_status_timer.stop()
+            self.setToolTip(f"{APP_NAME} - Failed to initialize OCR provider")
+            self.showMessage(APP_NAME, f"Failed to initialize the OCR provider '{config.ocr_provider}'. "
+                                       f"Check the log for details.", QSystemTrayIcon.MessageIcon.Critical)
+            QTimer.singleShot(3000, lambda: QApplication.instance().exit(1))
+            return
+        if not self.lookup.dictionary_ready.is_set():
+            progress = self.lookup.load_progress
+            status = self.lookup.load_status + (f" ({progress:.0%})" if progress is not None else "...")
+            self.setToolTip(f"{APP_NAME} - {status}")
+            return
+        if not self.ocr_processor.backend_ready.is_set():
+            self.setToolTip(f"{APP_NAME} - Loading {config.ocr_provider}...")
+            return
+        self.loading_status_timer.stop()
+        self.setToolTip(APP_NAME)
+
     def on_tray_activated(self, reason):
         """Handles clicks on the tray icon."""
         # QSystemTrayIcon.ActivationReason.Trigger is the enum for a normal left-click.
@@ -1,5 +1,6 @@
 # meikipop/main.py
 import argparse
+import importlib
 import signal
 import sys
 import threading
@@ -17,6 +18,8 @@ from meikipop.ocr.hit_scan import HitScanner
 from meikipop.ocr.ocr import OcrProcessor
 from meikipop.screenshot.screenmanager import ScreenManager
 from meikipop.utils.lastest_queue import LatestValueQueue
+from meikipop.utils.session_recorder import session_recorder
+from meikipop.utils.tracing import pipeline_metrics
 
 
 def qt_message_handler(mode, context, message):
@@ -36,16 +39,26 @@ class SharedState:
 
         # events and queues
         self.screenshot_trigger_event = threading.Event()
-        self.ocr_queue = LatestValueQueue()
-        self.hit_scan_queue = LatestValueQueue()
-        self.lookup_queue = LatestValueQueue()
+        self.ocr_queue = LatestValueQueue("ocr")
+        self.hit_scan_queue = LatestValueQueue("hit_scan")
+        self.lookup_queue = LatestValueQueue("lookup")
 
         # screen lock - used by screen manager and popup
         self.screen_lock = threading.RLock()
 
 
-def run_gui():
+# settings that change how the pipeline reacts to input, stored with recorded sessions
+RECORDED_SETTINGS = ("hotkey", "max_lookup_length", "lookup_prefetch_radius", "lookup_cache_size_kb", "ocr_provider",
+                     "auto_scan_mode", "auto_scan_mode_lookups_without_hotkey", "auto_scan_interval_seconds",
+                     "auto_scan_on_mouse_move", "show_kanji")
+
+
+def run_gui(trace_path=None, record_path=None):
     setup_logging()
+    if trace_path:
+        pipeline_metrics.start_trace(trace_path)
+    if record_path:
+        session_recorder.start(record_path, {name: getattr(config, name) for name in RECORDED_SETTINGS})
     shared_state = SharedState()
 
     global original_handler
@@ -57,8 +70,8 @@ def run_gui():
     input_loop = InputLoop(shared_state)
     popup_window = Popup(shared_state, input_loop)
 
+    lookup = Lookup(shared_state, popup_window)  # starts loading the dictionary in the background
     screen_manager = ScreenManager(shared_state, input_loop)  # trigger region selection
-    lookup = Lookup(shared_state, popup_window)  # load dictionary
 
     ocr_processor = OcrProcessor(shared_state, screen_manager)
     hit_scanner = HitScanner(shared_state, input_loop, screen_manager)
@@ -85,6 +98,11 @@ def run_gui():
     signal.signal(signal.SIGTERM, signal_handler)
     exit_code = app.exec()
 
+    lookup.lookup_cache.log_stats()
+    pipeline_metrics.log_summary()
+    pipeline_metrics.stop_trace()
+    session_recorder.stop()
+    lookup.save_cache_snapshot()
     shared_state.running = False
     shared_state.screenshot_trigger_event.set()
     shared_state.ocr_queue.put(None)
@@ -93,34 +111,47 @@ def run_gui():
     sys.exit(exit_code)
 
 
+# subcommand -> (script module, help). each script parses its own arguments with its main(argv), so the options,
+# defaults and help texts live in one place. `meikipop <command> -h` shows them.
+SCRIPT_COMMANDS = {
+    "build-dict": ("meikipop.scripts.build_dictionary", "Build the dictionary from source files"),
+    "import-yomitan-dict-html": ("meikipop.scripts.import_yomitan_dict_html", "Import Yomitan dictionary (HTML format)"),
+    "import-yomitan-dict-text": ("meikipop.scripts.import_yomitan_dict_text", "Import Yomitan dictionary (text format)"),
+    "apply-freq": ("meikipop.scripts.apply_frequencies", "Apply Yomitan frequency dictionaries to the dictionary"),
+    "serve": ("meikipop.scripts.serve", "Serve dictionary lookups over localhost HTTP or a Unix socket"),
+    "lookup": ("meikipop.scripts.batch_lookup", "Dictionary lookups over text files or stdin (JSON lines)"),
+    "benchmark": ("meikipop.scripts.benchmark_lookup", "Benchmark dictionary lookups against the real dictionary"),
+    "replay": ("meikipop.scripts.replay_session", "Replay a session recorded with --record, headless"),
+}
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="meikipop",
         description="Universal Japanese OCR popup dictionary"
     )
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Write pipeline spans to a Chrome trace-event JSON file (open in ui.perfetto.dev)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="Record frames, ocr results and mouse/hotkey input to a session file for 'meikipop replay'")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
-
-    subparsers.add_parser("build-dict", help="Build the dictionary from source files")
-
-    import_html_parser = subparsers.add_parser("import-yomitan-dict-html", help="Import Yomitan dictionary (HTML format)")
-    import_html_parser.add_argument("dictionary_files", nargs='+', help="Path(s) to the dictionary zip file(s)")
-
-    import_text_parser = subparsers.add_parser("import-yomitan-dict-text", help="Import Yomitan dictionary (text format)")
-    import_text_parser.add_argument("dictionary_files", nargs='+', help="Path(s) to the dictionary zip file(s)")
-
-    args = parser.parse_args()
-
-    if args.command == "build-dict":
-        from meikipop.scripts.build_dictionary import main as build_main
-        build_main()
-    elif args.command == "import-yomitan-dict-html":
-        from meikipop.scripts.import_yomitan_dict_html import main as import_html_main
-        import_html_main([*args.dictionary_files])
-    elif args.command == "import-yomitan-dict-text":
-        from meikipop.scripts.import_yomitan_dict_text import main as import_text_main
-        import_text_main([*args.dictionary_files])
-    else:
-        run_gui()
+    for command, (_, command_help) in SCRIPT_COMMANDS.items():
+        # everything after the command, -h included, is left for the script's own parser
+        subparsers.add_parser(command, help=command_help, add_help=False)
+
+    args, script_argv = parser.parse_known_args()
+
+    if args.command is None:
+        if script_argv:
+            parser.error(f"unrecognized arguments: {' '.join(script_argv)}")
+        run_gui(trace_path=args.trace, record_path=args.record)
+        return
+
+    if args.command == "replay" and args.trace:
+        script_argv += ["--trace", args.trace]  # `meikipop --trace FILE replay ...` traces the replay
+    script = importlib.import_module(SCRIPT_COMMANDS[args.command][0])
+    sys.argv[0] = f"{parser.prog} {args.command}"  # the script's usage and errors read `meikipop <command>`
+    script.main(script_argv)
 
 
 if __name__ == "__main__":
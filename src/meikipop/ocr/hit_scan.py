@@ -1,14 +1,31 @@
 # meikipop/ocr/hit_scan.py
 import logging
 import threading
+from dataclasses import dataclass
 from typing import List
 
 from meikipop.gui.magpie_manager import magpie_manager
 from meikipop.ocr.interface import Paragraph
+from meikipop.utils.tracing import pipeline_metrics
 
 logger = logging.getLogger(__name__)  # Get the logger
 
 
+@dataclass(frozen=True)
+class HitScanResult:
+    """The paragraph text under the cursor and the index of the hovered character."""
+    full_text: str
+    char_index: int
+
+    @property
+    def character(self) -> str:
+        return self.full_text[self.char_index]
+
+    @property
+    def lookup_string(self) -> str:
+        return self.full_text[self.char_index:]
+
+
 class HitScanner(threading.Thread):
     def __init__(self, shared_state, input_loop, screen_manager):
         super().__init__(daemon=True, name="HitScanner")
@@ -21,11 +38,12 @@ class HitScanner(threading.Thread):
         logger.debug("HitScanner thread started.")
         while self.shared_state.running:
             try:
-                ocr_result = self.shared_state.hit_scan_queue.get()
+                ocr_result, trace_context = self.shared_state.hit_scan_queue.get_with_context()
                 if not self.shared_state.running: break
                 logger.debug("HitScanner: Triggered")
-                hit_scan_result = self.hit_scan(ocr_result)
-                self.shared_state.lookup_queue.put(hit_scan_result)
+                with pipeline_metrics.span('hit_scan', trace_context):
+                    hit_scan_result = self.hit_scan(ocr_result)
+                self.shared_state.lookup_queue.put(hit_scan_result, trace_context)
             except:
                 logger.exception("An unexpected error occurred in the hit scan loop. Continuing...")
         logger.debug("HitScanner thread stopped.")
@@ -61,7 +79,6 @@ class HitScanner(threading.Thread):
             return (left <= px <= right) and (top <= py <= bottom)
 
         hit_scan_result = None
-        lookup_string = None
         for para in paragraphs:
             if not is_in_box((norm_x, norm_y), para.box):
                 continue
@@ -107,17 +124,14 @@ class HitScanner(threading.Thread):
             if final_char_index >= len(full_text):
                 continue
 
-            character = full_text[final_char_index]
-            lookup_string = full_text[final_char_index:]
-            hit_scan_result = (full_text, final_char_index, character,
-                               lookup_string)  # this may be interesting for debugging, but only lookup_string is really relevant
+            # the full paragraph is kept so the lookup thread can prefetch neighbouring characters
+            hit_scan_result = HitScanResult(full_text, final_char_index)
             break
 
-        if hit_scan_result:
-            text, char_pos, char, lookup_string = hit_scan_result
-        #    truncated_text = (text[:40] + '...') if len(text) > 40 else text
-        #     config.user_log(f"  -> Looking up '{char}' at pos {char_pos} in text: \"{truncated_text}\"")
+        # if hit_scan_result:
+        #    truncated_text = (hit_scan_result.full_text[:40] + '...') if len(hit_scan_result.full_text) > 40 else hit_scan_result.full_text
+        #     config.user_log(f"  -> Looking up '{hit_scan_result.character}' at pos {hit_scan_result.char_index} in text: \"{truncated_text}\"")
         # else:
         #     config.user_log("hit scan unsuccessful")
 
-        return lookup_string
+        return hit_scan_result
@@ -1,9 +1,9 @@
 # meikipop/ocr/interface.py
 import abc
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Callable, List, Optional
 
-from PIL import Image
+from PIL import Image, ImageDraw
 
 
 @dataclass(frozen=True)
@@ -32,6 +32,15 @@ class Paragraph:
     is_vertical: bool  # True if text is top-to-bottom - optional
 
 
+def create_warm_up_image(width: int = 320, height: int = 96) -> Image.Image:
+    """A small synthetic image with a few lines of dark glyphs, for providers that want a warm-up scan."""
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(("meikipop 0123456789", "warm-up scan")):
+        draw.text((12, 12 + i * 32), line, fill="black")
+    return image
+
+
 class OcrProvider(abc.ABC):
     """
     Abstract base class for an OCR provider.
@@ -59,3 +68,24 @@ class OcrProvider(abc.ABC):
             error occurred. Returns an empty list if no text is found.
         """
         raise NotImplementedError
+
+    def warm_up(self):
+        """
+        Optional hook, called once in the background after the provider was created.
+
+        Local providers can use it to run a scan on a synthetic image (see create_warm_up_image),
+        so that lazy model loading and first-run allocations don't slow down the first real scan.
+        Remote providers should leave this as a no-op.
+        """
+        pass
+
+    def set_rescan_callback(self, callback: Callable[[], None]):
+        """
+        Optional hook, called with a function that requests a new scan. Providers whose results can
+        change while the screen doesn't (e.g. text received from a texthooker) call it when that happens.
+        """
+        pass
+
+    def close(self):
+        """Optional hook, called when the provider is replaced by another one. Release connections here."""
+        pass
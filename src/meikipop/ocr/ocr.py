@@ -5,22 +5,42 @@ import logging
 import sys
 import threading
 import time
+from importlib.metadata import entry_points
 from pathlib import Path
-from typing import Dict, Type, Optional
+from typing import Dict, Type, Optional, Union
 
 from meikipop.config.config import config
 from meikipop.ocr.interface import OcrProvider
-from meikipop.ocr.providers.glensv2 import GoogleLensOcrV2
+from meikipop.ocr.providers import PROVIDER_MANIFEST, DEFAULT_PROVIDER_NAME, ENTRY_POINT_GROUP
+from meikipop.utils.session_recorder import session_recorder
+from meikipop.utils.tracing import pipeline_metrics
 
 logger = logging.getLogger(__name__)  # Get the logger
 
 class OcrProcessor(threading.Thread):
-    def __init__(self, shared_state, screen_manager):
+    def __init__(self, shared_state, screen_manager, provider: Optional[OcrProvider] = None):
         super().__init__(daemon=True, name="OcrProcessor")
         self.shared_state = shared_state
         self.screen_manager = screen_manager
         self.ocr_backend: Optional[OcrProvider] = None
 
+        # providers can take seconds to construct (model downloads, onnx sessions, native libraries), so they are
+        # built on a background thread. screenshots that arrive in the meantime wait in the ocr queue.
+        self.backend_ready = threading.Event()
+        self.load_failed = False
+        self._switch_lock = threading.Lock()
+        self._switch_generation = 0
+        self._pending_provider_name: Optional[str] = None
+        self._startup_finished = False
+
+        if provider is not None:
+            # a ready-made provider (e.g. the recorded results of a replayed session) skips discovery and loading
+            self.available_providers = {provider.NAME: type(provider)}
+            self.ocr_backend = provider
+            self._startup_finished = True
+            self.backend_ready.set()
+            return
+
         self.available_providers = self._discover_providers()
         if not self.available_providers:
             logger.critical("No OCR providers found! The application cannot continue.")
@@ -30,20 +50,28 @@ class OcrProcessor(threading.Thread):
 
     def run(self):
         logger.debug("OCR thread started.")
+        while self.shared_state.running and not self.backend_ready.wait(timeout=0.1):
+            if self.load_failed:
+                logger.debug("OCR thread stopped.")
+                return
         while self.shared_state.running:
             try:
-                screenshot = self.shared_state.ocr_queue.get()
+                screenshot, trace_context = self.shared_state.ocr_queue.get_with_context()
                 if not self.shared_state.running: break
 
                 logger.debug("OCR: Triggered!")
 
+                ocr_backend = self.ocr_backend  # may be swapped by switch_provider at any time
                 start_time = time.perf_counter()
-                ocr_result = self.ocr_backend.scan(screenshot)
+                with pipeline_metrics.span('ocr', trace_context):
+                    ocr_result = ocr_backend.scan(screenshot)
+                ocr_duration = time.perf_counter() - start_time
                 logger.info(
-                    f"{self.ocr_backend.NAME} found {len(ocr_result) if ocr_result else 0} paragraphs in {(time.perf_counter() - start_time):.3f}s.")
+                    f"{ocr_backend.NAME} found {len(ocr_result) if ocr_result else 0} paragraphs in {ocr_duration:.3f}s.")
+                session_recorder.record_ocr(screenshot, ocr_backend.NAME, ocr_result, ocr_duration)
                 # todo keep last ocr result?
 
-                self.shared_state.hit_scan_queue.put(ocr_result)
+                self.shared_state.hit_scan_queue.put(ocr_result, trace_context)
             except:
                 logger.exception("An unexpected error occurred in the ocr loop. Continuing...")
             finally:
@@ -53,34 +81,63 @@ class OcrProcessor(threading.Thread):
 
     # todo combine methods?
     def switch_provider(self, provider_name: str):
-        if self.ocr_backend and provider_name == self.ocr_backend.NAME:
-            return
+        """Builds the new provider in the background. The current one keeps serving until the new one is ready."""
+        with self._switch_lock:
+            current_name = self._pending_provider_name or (self.ocr_backend.NAME if self.ocr_backend else None)
+            if provider_name == current_name:
+                return
+
+            if provider_name not in self.available_providers:
+                logger.error(f"Attempted to switch to an unknown provider: '{provider_name}'")
+                return
 
-        if provider_name in self.available_providers:
             logger.info(f"Switching OCR provider to '{provider_name}'...")
-            provider_class = self.available_providers[provider_name]
-            try:
-                self.ocr_backend = provider_class()
-                logger.info(f"Successfully switched OCR provider to '{self.ocr_backend.NAME}'")
-                config.ocr_provider = self.ocr_backend.NAME
-                config.save()  # todo fix tray showing wrong provider
-                if config.auto_scan_mode:
-                    self.shared_state.hit_scan_queue.put(None)
-                    self.screen_manager.force_screenshot_trigger()
-                    self.shared_state.screenshot_trigger_event.set()
-            except Exception as e:
-                logger.error(f"Failed to instantiate provider '{provider_name}': {e}", exc_info=True)
+            self._switch_generation += 1
+            self._pending_provider_name = provider_name
+            generation = self._switch_generation
+
+        threading.Thread(target=self._switch_provider_in_background, args=(provider_name, generation),
+                         daemon=True, name="OcrProviderLoader").start()
+
+    def _switch_provider_in_background(self, provider_name: str, generation: int):
+        try:
+            new_backend = self._create_provider(provider_name)
+        except Exception as e:
+            logger.error(f"Failed to instantiate provider '{provider_name}': {e}", exc_info=True)
+            with self._switch_lock:
+                if generation != self._switch_generation:
+                    return
+                self._pending_provider_name = None
                 if self.ocr_backend:
                     logger.info(f"Reverting to previous provider '{self.ocr_backend.NAME}'.")
                     config.ocr_provider = self.ocr_backend.NAME
                     config.save()  # todo fix tray showing wrong provider
+                elif self._startup_finished:
+                    self.load_failed = True
+            return
 
-        else:
-            logger.error(f"Attempted to switch to an unknown provider: '{provider_name}'")
+        with self._switch_lock:
+            if generation != self._switch_generation:
+                logger.info(f"Discarding provider '{provider_name}', another provider was selected in the meantime.")
+                self._close_provider(new_backend)
+                return
+            self._pending_provider_name = None
+            old_backend, self.ocr_backend = self.ocr_backend, new_backend
+            self.backend_ready.set()
+            logger.info(f"Successfully switched OCR provider to '{self.ocr_backend.NAME}'")
+            config.ocr_provider = self.ocr_backend.NAME
+            config.save()  # todo fix tray showing wrong provider
+        if old_backend:
+            self._close_provider(old_backend)
+
+        if config.auto_scan_mode:
+            self.shared_state.hit_scan_queue.put(None)
+            self.screen_manager.force_screenshot_trigger()
+            self.shared_state.screenshot_trigger_event.set()
 
     def _load_provider_from_config(self):
         configured_provider_name = config.ocr_provider
-        default_provider_name = GoogleLensOcrV2.NAME
+        default_provider_name = DEFAULT_PROVIDER_NAME
 
         provider_to_load_name = configured_provider_name
 
@@ -100,30 +157,115 @@ class OcrProcessor(threading.Thread):
             provider_to_load_name = fallback_provider_name
 
         config.ocr_provider = provider_to_load_name
+        self._pending_provider_name = provider_to_load_name
 
-        provider_class = self.available_providers[provider_to_load_name]
-        try:
-            self.ocr_backend = provider_class()
-            logger.info(f"Initialized OCR with '{self.ocr_backend.NAME}' provider.")
-        except Exception as e:
-            logger.critical(f"Failed to instantiate provider '{provider_to_load_name}' on startup: {e}", exc_info=True)
+        threading.Thread(target=self._load_startup_provider, args=(provider_to_load_name, default_provider_name),
+                         daemon=True, name="OcrProviderLoader").start()
+
+    def _load_startup_provider(self, provider_name: str, default_provider_name: str):
+        for name in dict.fromkeys([provider_name, default_provider_name]):
+            if name not in self.available_providers:
+                continue
             try:
-                self.switch_provider(default_provider_name)
+                new_backend = self._create_provider(name)
             except Exception as e:
-                self.ocr_backend = None
-                sys.exit(1)
+                logger.critical(f"Failed to instantiate provider '{name}' on startup: {e}", exc_info=True)
+                continue
+            with self._switch_lock:
+                self._startup_finished = True
+                # if the user already picked another provider, this one serves until that one is ready
+                if self.ocr_backend is None:
+                    self.ocr_backend = new_backend
+                    self.backend_ready.set()
+                    logger.info(f"Initialized OCR with '{self.ocr_backend.NAME}' provider.")
+                else:
+                    self._close_provider(new_backend)
+                if self._switch_generation == 0:
+                    self._pending_provider_name = None
+                    config.ocr_provider = new_backend.NAME
+            return
+
+        with self._switch_lock:
+            self._startup_finished = True
+            if self._switch_generation == 0:
+                self._pending_provider_name = None
+            if self.ocr_backend is None and self._pending_provider_name is None:
+                # nothing to fall back to, the tray icon reports this and exits
+                self.load_failed = True
+
+    def _create_provider(self, provider_name: str) -> OcrProvider:
+        with pipeline_metrics.trace(f"create provider ({provider_name})"):
+            return self._create_and_warm_up_provider(provider_name)
+
+    def _create_and_warm_up_provider(self, provider_name: str) -> OcrProvider:
+        start_time = time.perf_counter()
+        provider_class = self._get_provider_class(provider_name)
+        ocr_backend = provider_class()
+        ocr_backend.set_rescan_callback(lambda: self._request_rescan(ocr_backend))
+        logger.debug(f"Created '{provider_name}' in {(time.perf_counter() - start_time):.3f}s")
+        if config.ocr_warm_up:
+            start_time = time.perf_counter()
+            try:
+                ocr_backend.warm_up()
+                logger.debug(f"Warmed up '{provider_name}' in {(time.perf_counter() - start_time):.3f}s")
+            except Exception as e:
+                logger.warning(f"Warm-up of OCR provider '{provider_name}' failed: {e}")
+        return ocr_backend
+
+    def _request_rescan(self, ocr_backend: OcrProvider):
+        # the provider has new results although the screen may not have changed (e.g. a text source)
+        if ocr_backend is not self.ocr_backend:
+            return
+        self.screen_manager.force_screenshot_trigger()
+        self.shared_state.screenshot_trigger_event.set()
+
+    @staticmethod
+    def _close_provider(ocr_backend: OcrProvider):
+        try:
+            ocr_backend.close()
+        except Exception as e:
+            logger.warning(f"Failed to close OCR provider '{ocr_backend.NAME}': {e}")
+
+    def _get_provider_class(self, provider_name: str) -> Type[OcrProvider]:
+        """Returns the provider class for `provider_name`, importing its module on first use."""
+        provider = self.available_providers[provider_name]
+        if not isinstance(provider, str):
+            return provider
+
+        module_name, _, class_name = provider.partition(':')
+        logger.debug(f"Importing OCR provider '{provider_name}' from '{module_name}'")
+        start_time = time.perf_counter()
+        provider_class = getattr(importlib.import_module(module_name), class_name)
+        if not (inspect.isclass(provider_class) and issubclass(provider_class, OcrProvider)):
+            raise TypeError(f"'{provider}' is not an OcrProvider")
+        if provider_class.NAME != provider_name:
+            logger.warning(f"OCR provider '{provider}' is registered as '{provider_name}' "
+                           f"but is named '{provider_class.NAME}'.")
+        logger.debug(f"Imported '{provider_name}' in {(time.perf_counter() - start_time):.3f}s")
+        self.available_providers[provider_name] = provider_class
+        return provider_class
+
+    def _discover_providers(self) -> Dict[str, Union[str, Type[OcrProvider]]]:
+        # Registered providers are only recorded by name and import path, nothing gets imported here.
+        providers: Dict[str, Union[str, Type[OcrProvider]]] = dict(PROVIDER_MANIFEST)
+        try:
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+                providers.setdefault(entry_point.name, entry_point.value)
+                logger.debug(f" -> Registered provider from entry point: '{entry_point.name}'")
+        except Exception as e:
+            logger.warning(f"Could not read OCR provider entry points: {e}")
+
+        registered_packages = {spec.split(':')[0].rsplit('.', 2)[-2] for spec in PROVIDER_MANIFEST.values()}
 
-    def _discover_providers(self) -> Dict[str, Type[OcrProvider]]:
-        providers: Dict[str, Type[OcrProvider]] = {}
-        
         # Get the package base path
         import meikipop
         package_dir = Path(meikipop.__file__).parent
         providers_path = package_dir / "ocr" / "providers"
 
-        logger.debug(f"Scanning for providers in: {providers_path}")
+        # Unregistered provider packages (e.g. custom providers) are discovered by importing them.
+        logger.debug(f"Scanning for unregistered providers in: {providers_path}")
         for subdir in providers_path.iterdir():
-            if subdir.is_dir() and (subdir / "__init__.py").exists():
+            if subdir.is_dir() and (subdir / "__init__.py").exists() and subdir.name not in registered_packages:
                 provider_name = subdir.name
                 try:
                     module_name = f"meikipop.ocr.providers.{provider_name}"
@@ -0,0 +1,19 @@
+# meikipop/ocr/providers/__init__.py
+
+# Static registry of the bundled providers: NAME -> "module:ClassName".
+# Importing a provider can be expensive (onnxruntime, protobuf bindings, websockets...), so only
+# the selected provider is imported at startup and the others are imported when the user picks them.
+# Provider packages that are not listed here are still discovered by importing them (see OcrProcessor),
+# and installed packages can register providers under the 'meikipop.ocr_providers' entry point group.
+PROVIDER_MANIFEST = {
+    "meikiocr (local)": "meikipop.ocr.providers.meikiocr.provider:MeikiOcrProvider",
+    "Google Lens (remote)": "meikipop.ocr.providers.glensv2.provider:GoogleLensOcrV2",
+    "Chrome Screen AI (local)": "meikipop.ocr.providers.screenai.provider:ScreenAiOcr",
+    "owocr (Websocket)": "meikipop.ocr.providers.owocr.provider:OwocrWebsocketProvider",
+    "Text source (Websocket/Pipe)": "meikipop.ocr.providers.textsource.provider:TextSourceProvider",
+    "Dummy OCR (Developer Template)": "meikipop.ocr.providers.dummy.provider:DummyProvider",
+}
+
+DEFAULT_PROVIDER_NAME = "Google Lens (remote)"
+
+ENTRY_POINT_GROUP = "meikipop.ocr_providers"
@@ -9,7 +9,7 @@ from PIL import Image
 from meikiocr import MeikiOCR
 
 # Import the "contract" classes from your application's interface
-from meikipop.ocr.interface import BoundingBox, OcrProvider, Paragraph, Word
+from meikipop.ocr.interface import BoundingBox, OcrProvider, Paragraph, Word, create_warm_up_image
 from meikipop.ocr.providers.postprocessing import group_lines_into_paragraphs
 
 logger = logging.getLogger(__name__)
@@ -74,6 +74,10 @@ class MeikiOcrProvider(OcrProvider):
             logger.error(f"an error occurred in {self.NAME}: {e}", exc_info=True)
             return None  # returning none indicates a failure.
 
+    def warm_up(self):
+        """Runs one scan on a synthetic image so the first real scan doesn't pay for session warm-up."""
+        self.scan(create_warm_up_image())
+
     def _to_normalized_bbox(self, bbox_pixels: list, img_width: int, img_height: int) -> BoundingBox:
         """converts an [x1, y1, x2, y2] pixel bbox to a normalized meikipop BoundingBox."""
         x1, y1, x2, y2 = bbox_pixels
@@ -11,7 +11,7 @@ from typing import List, Optional
 from PIL import Image
 from .chrome_screen_ai_pb2 import VisualAnnotation
 
-from meikipop.ocr.interface import OcrProvider, Paragraph, Word, BoundingBox
+from meikipop.ocr.interface import OcrProvider, Paragraph, Word, BoundingBox, create_warm_up_image
 from meikipop.ocr.providers.postprocessing import group_lines_into_paragraphs
 
 JAPANESE_REGEX = re.compile(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]')
@@ -168,6 +168,10 @@ class ScreenAiOcr(OcrProvider):
             logger.error(f"{self.NAME} error: {e}", exc_info=True)
             return None
 
+    def warm_up(self):
+        """The first call into the library is much slower than the following ones, so get it out of the way."""
+        self.scan(create_warm_up_image())
+
     def _transform(self, response: VisualAnnotation, img_w: int, img_h: int) -> List[Paragraph]:
         raw_lines = []
         for line_box in response.lines:
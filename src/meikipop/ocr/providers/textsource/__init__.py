@@ -0,0 +1,2 @@
+# meikipop/ocr/providers/textsource/__init__.py
+from .provider import TextSourceProvider
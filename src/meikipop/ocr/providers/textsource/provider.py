@@ -0,0 +1,195 @@
+# meikipop/ocr/providers/textsource/provider.py
+import json
+import logging
+import math
+import os
+import select
+import threading
+from typing import Callable, List, Optional
+
+from PIL import Image
+
+from meikipop.config.config import config, IS_WINDOWS
+from meikipop.ocr.interface import BoundingBox, OcrProvider, Paragraph, Word
+from meikipop.utils.paths import paths
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_INTERVAL_SECONDS = 3
+PIPE_POLL_SECONDS = 0.5  # how often the pipe reader checks whether the provider was closed
+# keys that common texthookers (Textractor websocket plugins, texthooker-ui, agents) use for the line of text
+JSON_TEXT_KEYS = ("sentence", "text", "line", "data")
+
+
+class TextSourceProvider(OcrProvider):
+    """
+    A provider that skips OCR entirely and uses text from an external source instead, e.g. a texthooker.
+
+    The latest received text is laid out over the scan area as evenly spaced character boxes, so it
+    works best when the scan area is set to the game's text box. Every new line of text requests a
+    rescan, so the popup updates without the screen having to change.
+
+    Sources (setting 'text_source'):
+      - 'websocket': connects to text_source_websocket_uri and treats every message as a new line of
+        text (plain text, or JSON with a "sentence"/"text" field).
+      - 'pipe': creates a named pipe (FIFO) in the cache directory and reads one line of text per line
+        written to it, e.g. `echo 食べたい > ~/.cache/meikipop/text_source.fifo`. Not available on Windows.
+    """
+    NAME = "Text source (Websocket/Pipe)"
+
+    def __init__(self):
+        self._text = ""
+        self._lock = threading.Lock()
+        self._rescan_callback: Optional[Callable[[], None]] = None
+        self._closed = threading.Event()
+        self._websocket = None
+
+        source = config.text_source
+        if source == "pipe":
+            if IS_WINDOWS:
+                raise RuntimeError("The 'pipe' text source is not available on Windows, use 'websocket' instead.")
+            target = self._read_pipe
+        elif source == "websocket":
+            target = self._read_websocket
+        else:
+            raise ValueError(f"Unknown text source '{source}', expected 'websocket' or 'pipe'.")
+        threading.Thread(target=target, daemon=True, name="TextSourceReader").start()
+
+    def scan(self, image: Image.Image) -> Optional[List[Paragraph]]:
+        with self._lock:
+            text = self._text
+        if not text:
+            return []
+        return self._layout(text, image.width, image.height)
+
+    def set_rescan_callback(self, callback: Callable[[], None]):
+        self._rescan_callback = callback
+
+    def close(self):
+        self._closed.set()
+        websocket = self._websocket
+        if websocket:
+            websocket.close()
+
+    def _set_text(self, text: str):
+        text = text.strip()
+        if not text:
+            return
+        with self._lock:
+            if text == self._text:
+                return
+            self._text = text
+        logger.debug(f"{self.NAME} received: {text}")
+        if self._rescan_callback:
+            self._rescan_callback()
+
+    @staticmethod
+    def _extract_text(message) -> str:
+        if isinstance(message, bytes):
+            message = message.decode('utf-8', errors='replace')
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return message
+        if isinstance(data, dict):
+            for key in JSON_TEXT_KEYS:
+                if isinstance(data.get(key), str):
+                    return data[key]
+            return ""
+        # other JSON values (arrays, numbers, ...) carry no line of text
+        return data if isinstance(data, str) else ""
+
+    def _read_websocket(self):
+        from websockets.sync.client import connect
+
+        uri = config.text_source_websocket_uri
+        error_logged = False
+        while not self._closed.is_set():
+            try:
+                with connect(uri, open_timeout=3) as websocket:
+                    self._websocket = websocket
+                    logger.info(f"{self.NAME} connected to {uri}.")
+                    error_logged = False
+                    for message in websocket:
+                        self._set_text(self._extract_text(message))
+            except Exception as e:
+                if self._closed.is_set():
+                    break
+                if not error_logged:
+                    logger.error(f"{self.NAME} could not read from {uri}: {e}. Retrying in the background...")
+                    error_logged = True
+            finally:
+                self._websocket = None
+            self._closed.wait(RECONNECT_INTERVAL_SECONDS)
+
+    def _read_pipe(self):
+        pipe_path = os.path.join(paths.cache_dir, 'text_source.fifo')
+        logger.info(f"{self.NAME} reading lines from {pipe_path}")
+        while not self._closed.is_set():
+            try:
+                if not os.path.exists(pipe_path):
+                    os.mkfifo(pipe_path)
+                # opened non-blocking, so the reader never hangs in open() waiting for a writer and notices
+                # close() within PIPE_POLL_SECONDS, without taking a line meant for the next provider. our own
+                # write end keeps the pipe open between writers, so it never reports EOF.
+                read_fd = os.open(pipe_path, os.O_RDONLY | os.O_NONBLOCK)
+                try:
+                    write_fd = os.open(pipe_path, os.O_WRONLY)
+                    try:
+                        self._read_pipe_lines(read_fd)
+                    finally:
+                        os.close(write_fd)
+                finally:
+                    os.close(read_fd)
+            except OSError as e:
+                logger.error(f"{self.NAME} could not read from {pipe_path}: {e}")
+                self._closed.wait(RECONNECT_INTERVAL_SECONDS)
+
+    def _read_pipe_lines(self, read_fd: int):
+        pending = b""
+        while not self._closed.is_set():
+            readable, _, _ = select.select([read_fd], [], [], PIPE_POLL_SECONDS)
+            if not readable or self._closed.is_set():
+                continue
+            try:
+                pending += os.read(read_fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                self._set_text(line.decode('utf-8', errors='replace'))
+
+    @staticmethod
+    def _layout(text: str, img_width: int, img_height: int) -> List[Paragraph]:
+        """
+        Lays out `text` top to bottom over the image as a grid of square cells, as large as possible
+        while still fitting. Every line of the text becomes one paragraph that starts on a new row.
+        """
+        lines = [line for line in text.splitlines() if line.strip()]
+        total_chars = sum(len(line) for line in lines)
+        if not lines or img_width <= 0 or img_height <= 0:
+            return []
+
+        cell = min(img_height, math.sqrt(img_width * img_height / total_chars))
+        while True:
+            columns = max(1, int(img_width // cell))
+            rows = sum(math.ceil(len(line) / columns) for line in lines)
+            if rows * cell <= img_height or cell <= 1:
+                break
+            cell *= 0.95
+
+        cell_w, cell_h = cell / img_width, cell / img_height
+        paragraphs = []
+        row = 0
+        for line in lines:
+            words = []
+            for i, ch in enumerate(line):
+                column, line_row = i % columns, row + i // columns
+                words.append(Word(text=ch, separator="", box=BoundingBox(
+                    (column + 0.5) * cell_w, (line_row + 0.5) * cell_h, cell_w, cell_h)))
+            line_rows = math.ceil(len(line) / columns)
+            width = min(len(line), columns) * cell_w
+            line_box = BoundingBox(width / 2, (row + line_rows / 2) * cell_h, width, line_rows * cell_h)
+            paragraphs.append(Paragraph(full_text=line, words=words, box=line_box, is_vertical=False))
+            row += line_rows
+        return paragraphs
@@ -7,6 +7,8 @@ from PIL import Image
 
 from meikipop.config.config import config, IS_WAYLAND
 from meikipop.gui.region_selector import RegionSelector
+from meikipop.utils.session_recorder import session_recorder
+from meikipop.utils.tracing import TraceContext, pipeline_metrics
 
 if IS_WAYLAND:
     from . import wayland_mss_shim
@@ -64,11 +66,13 @@ class ScreenManager(threading.Thread):
                     continue
                 self.last_mouse_pos = self.input_loop.get_mouse_pos()
 
+                trace_context = TraceContext('frame')
                 logger.debug("screenmanager acquiring lock...")
-                with self.shared_state.screen_lock:
+                with pipeline_metrics.locked(self.shared_state.screen_lock, 'screen_lock'):
                     logger.debug("...successfully acquired lock by screenmanager")
                     start_time = time.perf_counter()
-                    screenshot = self.take_screenshot()
+                    with pipeline_metrics.span('capture', trace_context):
+                        screenshot = self.take_screenshot()
                 logger.debug("...successfully released lock by screenmanager")
                 processing_duration = time.perf_counter() - start_time
                 logger.debug(f"Screenshot {screenshot.size} complete in {processing_duration:.2f}s")
@@ -81,7 +85,8 @@ class ScreenManager(threading.Thread):
                 self.last_screenshot = screenshot
                 self.last_mouse_pos = self.input_loop.get_mouse_pos()
                 img = Image.frombytes("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
-                self.shared_state.ocr_queue.put(img)
+                session_recorder.record_frame(img, self.get_scan_geometry(), processing_duration)
+                self.shared_state.ocr_queue.put(img, trace_context)
                 self.last_ocr_put_time = time.perf_counter()
             except:
                 logger.exception("An unexpected error occurred in the screenshot loop. Continuing...")
@@ -0,0 +1,149 @@
+"""
+apply_frequencies.py
+Re-ranks an existing dictionary.pkl (and its appended segments) with one or more Yomitan
+frequency dictionaries, without re-importing or rebuilding the dictionary itself.
+
+Usage:
+    meikipop apply-freq freq.zip [freq2.zip ...] [-d dictionary.pkl] [--combine min|mean] [--weights 2,1]
+
+Only the freq field of the lookup_map entries changes; entries, senses and kanji are left
+as they are. Every map entry is looked up in each frequency dictionary on its own, by
+(written form, reading), falling back to the written form alone and then to the looked up
+surface with the reading. Its new rank is the best (lowest) of those ranks, or their weighted
+mean over the dictionaries that rank it. Entries no frequency dictionary knows keep their rank,
+or get DEFAULT_FREQ with --reset-missing.
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+import zipfile
+from typing import List, Optional
+
+from meikipop.config.config import DICT_PATH
+from meikipop.dictionary.customdict import load_segment_manifest, segment_dir
+from meikipop.scripts.yomitan_banks import DEFAULT_FREQ, load_freq_map_from_zip
+
+
+def lookup_rank(freq_map: dict, surface: str, written: str, reading: str) -> Optional[int]:
+    """
+    The rank of a map entry in one {(term, reading): rank} map: by (written form, reading), then by
+    the written form alone, then by the looked up surface with the reading. None if it has no rank.
+    """
+    rank = freq_map.get((written, reading))
+    if rank is None:
+        rank = freq_map.get((written, ''))
+    if rank is None:
+        rank = freq_map.get((surface, reading))
+    return rank
+
+
+def combine_ranks(ranks: List[Optional[int]], combine: str = 'min', weights: Optional[List[float]] = None) -> Optional[int]:
+    """
+    Combines the ranks one map entry got from each frequency dictionary (None where it has none) into
+    the minimum rank or the weighted mean of the dictionaries that rank it. None if no dictionary does.
+    """
+    if combine == 'min':
+        return min((rank for rank in ranks if rank is not None), default=None)
+
+    weighted_sum = weight_sum = 0.0
+    for rank, weight in zip(ranks, weights or [1.0] * len(ranks)):
+        if rank is not None:
+            weighted_sum += weight * rank
+            weight_sum += weight
+    return round(weighted_sum / weight_sum) if weight_sum else None
+
+
+def rerank_lookup_map(lookup_map: dict, freq_maps: List[dict], combine: str = 'min',
+                      weights: Optional[List[float]] = None, reset_missing: bool = False) -> int:
+    """
+    Replaces the freq field of every map entry with its combined rank in freq_maps, in place.
+    Returns the number of map entries changed.
+    """
+    changed = 0
+    for surface, me_list in lookup_map.items():
+        new_list = []
+        for me in me_list:
+            written, reading = me[0], me[1] or ''
+            rank = combine_ranks([lookup_rank(freq_map, surface, written, reading) for freq_map in freq_maps],
+                                 combine, weights)
+            if rank is None:
+                rank = DEFAULT_FREQ if reset_missing else me[2]
+            if rank != me[2]:
+                me = me[:2] + (rank,) + me[3:]
+                changed += 1
+            new_list.append(me)
+        lookup_map[surface] = new_list
+    return changed
+
+
+def _dictionary_files(dict_path: str) -> List[str]:
+    """The main dictionary pickle followed by the pickles of its segments."""
+    directory = segment_dir(dict_path)
+    return [dict_path] + [os.path.join(directory, segment['file']) for segment in load_segment_manifest(dict_path)]
+
+
+def _parse_weights(value: str) -> List[float]:
+    try:
+        weights = [float(v) for v in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("weights must be a comma separated list of numbers")
+    if any(w <= 0 for w in weights):
+        raise argparse.ArgumentTypeError("weights must be positive")
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Apply Yomitan frequency dictionaries to an existing dictionary.pkl')
+    parser.add_argument('zips', nargs='+', help='Path(s) to Yomitan frequency dictionary .zip files')
+    parser.add_argument('-d', '--dictionary', default=DICT_PATH, help=f'Dictionary pickle (default: {DICT_PATH})')
+    parser.add_argument('--combine', choices=('min', 'mean'), default='min',
+                        help='How to combine several frequency dictionaries: best rank or weighted mean (default: min)')
+    parser.add_argument('--weights', type=_parse_weights,
+                        help='Comma separated weights for --combine mean, one per zip (default: all 1)')
+    parser.add_argument('--reset-missing', action='store_true',
+                        help=f'Rank entries without a frequency as {DEFAULT_FREQ} instead of keeping their rank')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.dictionary):
+        print(f"ERROR: Dictionary not found: {args.dictionary}", file=sys.stderr)
+        sys.exit(1)
+    if args.weights and args.combine != 'mean':
+        print("ERROR: --weights only applies to --combine mean", file=sys.stderr)
+        sys.exit(1)
+    if args.weights and len(args.weights) != len(args.zips):
+        print(f"ERROR: {len(args.weights)} weights given for {len(args.zips)} frequency dictionaries", file=sys.stderr)
+        sys.exit(1)
+
+    freq_maps = []
+    for zip_path in args.zips:
+        if not os.path.isfile(zip_path):
+            print(f"ERROR: File not found: {zip_path}", file=sys.stderr)
+            sys.exit(1)
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            freq_maps.append(load_freq_map_from_zip(zf))
+        print(f"Loaded {len(freq_maps[-1])} frequencies from {os.path.basename(zip_path)}")
+    if not any(freq_maps):
+        print("ERROR: The given zip files contain no frequency data", file=sys.stderr)
+        sys.exit(1)
+
+    for path in _dictionary_files(args.dictionary):
+        t0 = time.time()
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+        changed = rerank_lookup_map(payload['lookup_map'], freq_maps, args.combine, args.weights,
+                                    args.reset_missing)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+        n_refs = sum(len(v) for v in payload['lookup_map'].values())
+        print(f"{os.path.basename(path)}: {changed} of {n_refs} lookup refs re-ranked in {time.time() - t0:.1f}s")
+
+    print("\nFrequencies applied.")
+
+
+if __name__ == '__main__':
+    main()
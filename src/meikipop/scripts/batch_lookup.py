@@ -0,0 +1,153 @@
+"""
+batch_lookup.py
+Runs dictionary lookups over text files or stdin and writes the results as JSON lines.
+
+Usage:
+    meikipop lookup novel.txt subs.srt [-o out.jsonl] [--offsets 0,4] [--jobs 8]
+    echo 食べたい | meikipop lookup
+
+Every input line is scanned at every character offset (or only at --offsets), exactly like
+hovering over that character in the GUI. Each offset with at least one result becomes one
+output line:
+    {"source": "novel.txt", "line": 1, "offset": 0, "results": [...]}
+Output lines keep the order of the input. Lines are processed in chunks by a LookupWorkerPool
+(dictionary/worker_pool.py) with a bounded number of chunks in flight, so memory stays flat on
+large corpora.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Iterable, Iterator, List, Tuple
+
+from meikipop.config.config import DICT_PATH
+from meikipop.dictionary.lookup import LookupEngine, entry_to_dict
+from meikipop.dictionary.worker_pool import LookupWorkerPool
+
+CHUNK_LINES = 200  # lines per work item sent to a worker
+
+# (source, line number, line text)
+Line = Tuple[str, int, str]
+
+
+def _annotate_chunk(engine: LookupEngine, chunk: Tuple[List[Line], dict]) -> Tuple[str, int, int]:
+    """Returns the JSON lines for a chunk of input lines, plus the number of lookups and hits."""
+    lines, options = chunk
+    offsets, max_length, include_kanji, include_empty = (
+        options['offsets'], options['max_length'], options['include_kanji'], options['include_empty'])
+    out = []
+    lookups = hits = 0
+    for source, line_no, text in lines:
+        for offset in (offsets if offsets is not None else range(len(text))):
+            if offset >= len(text) or text[offset].isspace():
+                continue
+            results = engine.lookup(text[offset:], max_length, include_kanji)
+            lookups += 1
+            if results:
+                hits += 1
+            elif not include_empty:
+                continue
+            out.append(json.dumps({'source': source, 'line': line_no, 'offset': offset,
+                                   'results': [entry_to_dict(e) for e in results]}, ensure_ascii=False))
+    return ''.join(line + '\n' for line in out), lookups, hits
+
+
+def _read_lines(paths: List[str]) -> Iterator[Line]:
+    for path in paths or ['-']:
+        if path == '-':
+            stream, source = sys.stdin, '<stdin>'
+            stream.reconfigure(encoding='utf-8')
+        else:
+            stream, source = open(path, 'r', encoding='utf-8', errors='replace'), path
+        try:
+            for line_no, line in enumerate(stream, start=1):
+                yield source, line_no, line.rstrip('\r\n')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def _chunks(lines: Iterable[Line], size: int) -> Iterator[List[Line]]:
+    iterator = iter(lines)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _run(chunks: Iterator[List[Line]], jobs: int, dictionary_path: str, options: dict) -> Iterator[tuple]:
+    """Yields the annotated chunks in input order."""
+    if jobs <= 1:
+        engine = LookupEngine()
+        if not engine.load(dictionary_path):
+            raise RuntimeError(f"Failed to load dictionary '{dictionary_path}'")
+        for chunk in chunks:
+            yield _annotate_chunk(engine, (chunk, options))
+        return
+
+    with LookupWorkerPool(jobs, dictionary_path) as pool:
+        yield from pool.map_chunks(_annotate_chunk, ((chunk, options) for chunk in chunks))
+
+
+def _parse_offsets(value: str) -> List[int]:
+    try:
+        offsets = sorted({int(v) for v in value.split(',') if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError("offsets must be a comma separated list of integers")
+    if any(o < 0 for o in offsets):
+        raise argparse.ArgumentTypeError("offsets must not be negative")
+    return offsets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dictionary lookups over text files or stdin, written as JSON lines')
+    parser.add_argument('files', nargs='*', help='Text files to annotate (default: stdin, "-" also reads stdin)')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('--offsets', type=_parse_offsets,
+                        help='Comma separated character offsets to look up in each line (default: every offset)')
+    parser.add_argument('--max-length', type=int, help='Maximum lookup length (default: max_lookup_length)')
+    parser.add_argument('--no-kanji', action='store_true', help='Do not include kanji entries')
+    parser.add_argument('--include-empty', action='store_true', help='Also write offsets without results')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes (default: number of cores)')
+    parser.add_argument('-d', '--dictionary', default=DICT_PATH, help=f'Dictionary pickle (default: {DICT_PATH})')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.dictionary):
+        print(f"ERROR: Dictionary not found: {args.dictionary}", file=sys.stderr)
+        sys.exit(1)
+    for path in args.files:
+        if path != '-' and not os.path.isfile(path):
+            print(f"ERROR: File not found: {path}", file=sys.stderr)
+            sys.exit(1)
+
+    options = {
+        'offsets': args.offsets,
+        'max_length': args.max_length,
+        'include_kanji': False if args.no_kanji else None,
+        'include_empty': args.include_empty,
+    }
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    if out is sys.stdout:
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    t0 = time.time()
+    total_lookups = total_hits = 0
+    try:
+        chunks = _chunks(_read_lines(args.files), CHUNK_LINES)
+        for text, lookups, hits in _run(chunks, args.jobs, args.dictionary, options):
+            out.write(text)
+            total_lookups += lookups
+            total_hits += hits
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.time() - t0
+    print(f"{total_lookups} lookups ({total_hits} with results) in {elapsed:.2f}s "
+          f"({total_lookups / elapsed if elapsed else 0:.0f}/s, {args.jobs} jobs)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
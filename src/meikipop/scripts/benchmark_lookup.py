@@ -0,0 +1,244 @@
+"""
+benchmark_lookup.py
+Micro-benchmarks for the dictionary hot path, run against the real dictionary.
+
+Usage:
+    meikipop benchmark [-d dictionary.pkl] [--corpus lines.txt] [--repeat 3]
+                       [--save-baseline before.json] [--compare before.json] [--threshold 0.1]
+
+Every corpus line is looked up at every character offset, like hovering over each character
+in the GUI. Benchmarks:
+    lookup           LookupEngine.lookup() with the LRU cache, as the Lookup thread calls it
+    do_lookup        LookupEngine._do_lookup() on an empty cache (the uncached search)
+    deconjugate      Deconjugator.deconjugate() for every prefix the search tries
+    get_map_entries  LookupEngine._get_map_entries() for every prefix the search tries
+
+Each benchmark reports ops/s, p50/p99 latency per call and, from a separate untimed pass
+under tracemalloc, the peak and allocated memory per pass (for lookup, on a cold cache). The
+lookup benchmark also reports the cache hit rate of the timed passes, overall and for the first
+pass alone, which runs on a cold cache.
+
+--save-baseline writes the results as JSON; --compare prints the change against such a file
+and exits with status 1 if a benchmark got slower than --threshold (default 10%).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+from meikipop.config.config import DICT_PATH, config
+from meikipop.dictionary.lookup import LookupEngine
+
+# lines of the built-in corpus: conjugated verbs and adjectives, long kana runs, katakana
+# loanwords, mixed scripts and separators. lookups start at every offset of every line.
+DEFAULT_CORPUS = [
+    "昨日は友達と映画を見に行きましたが、あまり面白くなかった。",
+    "食べさせられたくなかったのに、結局全部食べてしまった。",
+    "彼女はもう帰ってしまったらしいです。",
+    "読んでいない本が山ほど残っている。",
+    "行かなければならないと分かっていても、なかなか起きられない。",
+    "ありがとうございます、おかげさまでげんきにしております。",
+    "そんなことはどうでもいいじゃないかとおもうんだけどなあ",
+    "コンピューターのセキュリティアップデートをインストールしてください。",
+    "スマートフォンのバッテリーがすぐになくなってしまう。",
+    "「お前はもう死んでいる」と彼は静かに言った。",
+    "【速報】東京都で新たに大規模なイベントが開催決定！",
+    "美しい景色を眺めながら、ゆっくりと温泉に浸かりたい。",
+    "勉強しなさいと言われても、やる気が出ないんだよね…",
+    "この問題について、もう一度よく考えてみる必要があるでしょう。",
+    "ちょっと待ってて！すぐ戻るから。",
+    "飲み込まれそうな暗闇の中で、彼らは光を探し続けた。",
+    "申し訳ございませんが、本日の営業は終了いたしました。",
+    "見せてもらえませんか？",
+]
+
+
+def build_texts(lines: List[str], engine: LookupEngine) -> List[str]:
+    """The prepared lookup text at every non-blank offset of every line, in order."""
+    texts = []
+    for line in lines:
+        for offset in range(len(line)):
+            if line[offset].isspace():
+                continue
+            text = engine.prepare_text(line[offset:])
+            if text:
+                texts.append(text)
+    return texts
+
+
+def _percentile(sorted_values: List[int], fraction: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_benchmark(func: Callable, args: List, repeat: int, before_pass: Callable = None,
+                  after_pass: Callable = None, before_allocation_pass: Callable = None) -> dict:
+    """
+    Calls func(arg) for every arg, `repeat` times. Returns throughput, latency and allocation figures.
+    before_pass/after_pass run around every timed pass (after_pass gets the pass index),
+    before_allocation_pass (default: before_pass) before the untimed allocation pass.
+    """
+    latencies = []
+    total_ns = 0
+    for i in range(repeat):
+        if before_pass:
+            before_pass()
+        for arg in args:
+            start = time.perf_counter_ns()
+            func(arg)
+            elapsed = time.perf_counter_ns() - start
+            latencies.append(elapsed)
+            total_ns += elapsed
+        if after_pass:
+            after_pass(i)
+    latencies.sort()
+
+    # allocations are measured in a separate pass, since tracing slows every allocation down
+    before_allocation_pass = before_allocation_pass or before_pass
+    if before_allocation_pass:
+        before_allocation_pass()
+    tracemalloc.start()
+    try:
+        snapshot_before = tracemalloc.take_snapshot()
+        for arg in args:
+            func(arg)
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, 'filename')
+                    if stat.size_diff > 0)
+
+    return {
+        'calls': len(latencies),
+        'ops_per_s': len(latencies) / (total_ns / 1e9) if total_ns else 0.0,
+        'p50_us': _percentile(latencies, 0.50) / 1000,
+        'p99_us': _percentile(latencies, 0.99) / 1000,
+        'peak_kib': peak / 1024,
+        'retained_kib': allocated / 1024,
+    }
+
+
+def run_all(engine: LookupEngine, texts: List[str], repeat: int) -> dict:
+    prefixes = [text[:n] for text in texts for n in range(len(text), 0, -1)]
+    cache = engine.lookup_cache
+    results = {}
+
+    # the Lookup thread goes through LookupEngine.lookup(), so this is what a hover costs.
+    # the cache stays warm across the timed passes; stats are taken before the allocation pass,
+    # which starts from a cleared cache again
+    cache.clear()
+    cache.hits = cache.prefix_hits = cache.misses = 0
+    pass_stats = {}
+
+    def record_stats(pass_index: int):
+        if pass_index == 0:
+            pass_stats['cold'] = cache.stats()
+        pass_stats['all'] = cache.stats()
+
+    results['lookup'] = run_benchmark(engine.lookup, texts, repeat, after_pass=record_stats,
+                                      before_allocation_pass=cache.clear)
+    stats, cold = pass_stats['all'], pass_stats['cold']
+    results['lookup'].update(cache_hit_rate=stats['hit_rate'], cache_hits=stats['hits'],
+                             cache_prefix_hits=stats['prefix_hits'], cache_misses=stats['misses'],
+                             cold_cache_hit_rate=cold['hit_rate'], cold_cache_hits=cold['hits'],
+                             cold_cache_prefix_hits=cold['prefix_hits'], cold_cache_misses=cold['misses'])
+
+    # _do_lookup also consults the cache for prefixes; an empty cache makes every call a full search
+    results['do_lookup'] = run_benchmark(engine._do_lookup, texts, repeat, before_pass=cache.clear)
+    results['deconjugate'] = run_benchmark(engine.deconjugator.deconjugate, prefixes, repeat)
+    results['get_map_entries'] = run_benchmark(engine._get_map_entries, prefixes, repeat)
+    cache.clear()
+    return results
+
+
+def print_results(results: dict, baseline: dict = None, threshold: float = 0.1) -> List[str]:
+    """Prints a results table, with the change against `baseline` if given. Returns the regressed benchmarks."""
+    regressions = []
+    print(f"{'benchmark':<16} {'calls':>9} {'ops/s':>11} {'p50 µs':>9} {'p99 µs':>9} {'peak KiB':>9} {'kept KiB':>9}")
+    for name, r in results.items():
+        line = (f"{name:<16} {r['calls']:>9} {r['ops_per_s']:>11.0f} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f} "
+                f"{r['peak_kib']:>9.0f} {r['retained_kib']:>9.0f}")
+        base = (baseline or {}).get(name)
+        if base and base.get('ops_per_s'):
+            change = r['ops_per_s'] / base['ops_per_s'] - 1
+            line += f"   {change:+.1%} ops/s, p99 {base['p99_us']:.1f} -> {r['p99_us']:.1f} µs"
+            if change < -threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    if 'cache_hit_rate' in results.get('lookup', {}):
+        r = results['lookup']
+        print(f"lookup cache: hit rate {r['cache_hit_rate']:.1%} over all passes ({r['cache_hits']} hits, "
+              f"{r['cache_prefix_hits']} prefix hits, {r['cache_misses']} misses), "
+              f"{r['cold_cache_hit_rate']:.1%} in the first pass ({r['cold_cache_hits']} hits, "
+              f"{r['cold_cache_prefix_hits']} prefix hits, {r['cold_cache_misses']} misses)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark dictionary lookups against the real dictionary')
+    parser.add_argument('-d', '--dictionary', default=DICT_PATH, help=f'Dictionary pickle (default: {DICT_PATH})')
+    parser.add_argument('--corpus', help='Text file to use as the corpus, one line per entry (default: built-in)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes over the corpus (default: 3)')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Write the results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='Compare against a baseline written with --save-baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Slowdown in ops/s counted as a regression by --compare (default: 0.1 = 10%%)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.dictionary):
+        print(f"ERROR: Dictionary not found: {args.dictionary}", file=sys.stderr)
+        sys.exit(1)
+    lines = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus, 'r', encoding='utf-8') as f:
+            lines = [line.rstrip('\r\n') for line in f if line.strip()]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    engine = LookupEngine()
+    t0 = time.time()
+    if not engine.load(args.dictionary):
+        print(f"ERROR: Failed to load dictionary '{args.dictionary}'", file=sys.stderr)
+        sys.exit(1)
+    texts = build_texts(lines, engine)
+    print(f"Dictionary loaded in {time.time() - t0:.2f}s, {len(texts)} lookup texts from {len(lines)} lines, "
+          f"{args.repeat} passes\n")
+
+    results = run_all(engine, texts, args.repeat)
+    meta = {
+        'dictionary': os.path.abspath(args.dictionary),
+        'dictionary_hash': engine.dictionary.content_hash(),
+        'corpus': os.path.abspath(args.corpus) if args.corpus else 'built-in',
+        'texts': len(texts),
+        'repeat': args.repeat,
+        'max_lookup_length': config.max_lookup_length,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+    if baseline and baseline.get('meta', {}).get('dictionary_hash') != meta['dictionary_hash']:
+        print("Note: the baseline was measured on a different dictionary build.\n")
+    regressions = print_results(results, baseline and baseline.get('results'), args.threshold)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,21 +4,28 @@ Builds dictionary.pkl from downloaded source files.
 Downloaded source files are cached in user cache directory and reused on subsequent runs.
 """
 
+import argparse
+import glob
 import gzip
+import hashlib
 import io
 import json
+import multiprocessing
 import os
 import pickle
 import re
+import sys
 import time
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from itertools import count
-from typing import Optional
+from typing import Iterator, Optional
 import xml.etree.ElementTree as StdET
 
 import requests
 from lxml import etree
 
+from meikipop.dictionary.customdict import DICT_FORMAT_VERSION, add_pos_masks, compact_entries
 from meikipop.utils.paths import paths
 
 
@@ -27,7 +34,12 @@ from meikipop.utils.paths import paths
 DATA_DIR = paths.cache_dir
 OUTPUT_PATH = paths.dictionary_path
 DECONJUGATOR_PATH = os.path.join(os.path.dirname(__file__), 'deconjugator.json')
+STAGE_CACHE_DIR = os.path.join(DATA_DIR, 'stages')
+# part of every stage cache key: bump when the output of a stage changes for the same inputs
+STAGE_CACHE_VERSION = 1
 SYNTHETIC_ID_START = 10_000_000  # safely above any real JMdict seq number
+BUILD_CHUNK_ENTRIES = 2000  # JMdict entries per work item of a build worker
+CHUNKS_IN_FLIGHT_PER_JOB = 4
 DEFAULT_FREQ       = 999_999
 
 URLS = {
@@ -74,24 +86,78 @@ def get_variants(reading: str) -> set:
     return v
 
 
+def _strip_okurigana(word: str, reading: str) -> str:
+    """The reading without the trailing kana it shares with the word, e.g. (食べる, たべる) -> た."""
+    end = 0
+    while (end < len(word) and end < len(reading) and
+           is_hiragana(word[-1 - end]) and word[-1 - end] == reading[-1 - end]):
+        end += 1
+    return reading[:len(reading) - end]
+
+def _substrings(text: str) -> frozenset:
+    """Every substring of `text`, including the empty one."""
+    return frozenset(text[i:j] for i in range(len(text) + 1) for j in range(i, len(text) + 1))
+
+
 # ── Download / cache ───────────────────────────────────────────────────────────
 
 def ensure_dirs():
     os.makedirs(DATA_DIR, exist_ok=True)
 
-def load_or_download(key: str) -> bytes:
+def download_if_missing(key: str) -> str:
+    """Returns the path of the cached source file, downloading it first if needed."""
     path = os.path.join(DATA_DIR, key)
     if os.path.exists(path):
         print(f"  Using cached: {path}")
-        with open(path, 'rb') as f:
-            return f.read()
+        return path
     url = URLS[key]
     print(f"  Downloading {key} from {url} ...")
     data = requests.get(url, timeout=120).content
     with open(path, 'wb') as f:
         f.write(data)
     print(f"  Saved {len(data) // 1024} KB to {path}")
-    return data
+    return path
+
+def read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# ── Stage cache ────────────────────────────────────────────────────────────────
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stage_key(*input_hashes: str) -> str:
+    """Cache key of a stage output: its input file hashes plus STAGE_CACHE_VERSION."""
+    return hashlib.sha1('|'.join((str(STAGE_CACHE_VERSION),) + input_hashes).encode()).hexdigest()[:16]
+
+def run_stage(name: str, key: str, compute, use_cache: bool = True):
+    """
+    Returns the cached output of stage `name` for `key`, or runs compute() and caches its result.
+    Only the latest output of every stage is kept.
+    """
+    path = os.path.join(STAGE_CACHE_DIR, f'{name}-{key}.pkl')
+    if use_cache and os.path.exists(path):
+        print(f"  Using cached {name} stage: {path}")
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"  Cached {name} stage is unreadable ({e}), rebuilding ...")
+
+    result = compute()
+    os.makedirs(STAGE_CACHE_DIR, exist_ok=True)
+    for stale in glob.glob(os.path.join(STAGE_CACHE_DIR, f'{name}-*.pkl')):
+        os.remove(stale)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+    return result
 
 
 # ── Frequency ──────────────────────────────────────────────────────────────────
@@ -113,19 +179,58 @@ def load_freq_map(csv_bytes: bytes) -> dict:
 
 # ── JMdict parsing ─────────────────────────────────────────────────────────────
 
-def parse_jmdict_root(gz_bytes: bytes):
-    """Parse JMdict_e from gzipped bytes, resolving entity references."""
-    xml_bytes = gzip.decompress(gz_bytes)
-    parser    = etree.XMLParser(resolve_entities=False)
-    tree      = etree.parse(io.BytesIO(xml_bytes), parser)
-    # Entity nodes (e.g. &v1;) carry their resolved text; append into parent.text
-    for ent in tree.iter(etree.Entity):
-        parent = ent.getparent()
-        if parent is not None:
-            parent.text = (parent.text or '') + (ent.text or '')
-            if ent.tail:
-                parent.text += ent.tail
-    return tree.getroot()
+def iter_jmdict_entries(gz_path: str) -> Iterator:
+    """
+    Stream the <entry> elements of a gzipped JMdict_e file, resolving entity references.
+    Each element is cleared once the caller moves on to the next one, so only one entry
+    is held in memory at a time and nothing may keep references into a yielded entry.
+    """
+    with gzip.open(gz_path, 'rb') as f:
+        for _, entry_elem in etree.iterparse(f, events=('end',), tag='entry', resolve_entities=False):
+            # Entity nodes (e.g. &v1;) carry their resolved text; append into parent.text
+            for ent in list(entry_elem.iter(etree.Entity)):
+                parent = ent.getparent()
+                if parent is not None:
+                    parent.text = (parent.text or '') + (ent.text or '')
+                    if ent.tail:
+                        parent.text += ent.tail
+            yield entry_elem
+            entry_elem.clear(keep_tail=False)
+            # drop the already processed siblings still attached to the root
+            while entry_elem.getprevious() is not None:
+                del entry_elem.getparent()[0]
+
+
+class KanjiWordData:
+    """
+    The per-word JMdict data that kanjidic reading ranking and example selection need,
+    collected while JMdict is streamed so the entries don't have to be walked twice.
+    Independent of the frequency list; build_kanjidic_data skips words without a rank.
+    """
+
+    def __init__(self):
+        self.word_to_readings:    dict[str, list] = defaultdict(list)
+        self.word_to_jmdict_info: dict[str, dict] = {}
+        self.kanji_to_words:      dict[str, list] = defaultdict(list)
+
+    def add_entry(self, entry_elem):
+        k_nodes = entry_elem.findall('k_ele')
+        r_nodes = entry_elem.findall('r_ele')
+        if not k_nodes or not r_nodes:
+            return
+        is_priority = any(t.text in PRIORITY_TAGS for t in entry_elem.iter('ke_pri', 're_pri'))
+        display_reb = r_nodes[0].find('reb').text
+        gloss_node  = entry_elem.find('.//sense/gloss')
+        display_m   = gloss_node.text if gloss_node is not None else ''
+        entry_readings = [kata_to_hira(r.find('reb').text) for r in r_nodes]
+        for k_node in k_nodes:
+            word = k_node.find('keb').text
+            for r in entry_readings:
+                self.word_to_readings[word].append((r, is_priority))
+            self.word_to_jmdict_info[word] = {'r': display_reb, 'm': display_m}
+            for char in word:
+                if 0x4E00 <= ord(char) <= 0x9FFF:
+                    self.kanji_to_words[char].append(word)
 
 
 def _process_senses(entry_elem) -> list:
@@ -168,44 +273,121 @@ def _applicable_sense_indices(senses: list, keb: Optional[str], reb: str) -> tup
     return tuple(out)
 
 
-def build_jmdict_data(root, freq_map: dict):
+def _extract_entry(entry_elem) -> Optional[tuple]:
+    """
+    Plain-data (picklable) form of one JMdict <entry>: (seq, k_data, r_data, senses),
+    or None if the entry has no usable sense.
+    """
+    senses = _process_senses(entry_elem)
+    if not senses:
+        return None
+
+    seq = int(entry_elem.find('ent_seq').text)
+
+    # (keb, frozenset of ke_inf flags)
+    k_data = [
+        (k.find('keb').text,
+         frozenset(e.text.strip('&;') for e in k.findall('ke_inf') if e.text))
+        for k in entry_elem.findall('k_ele')
+    ]
+
+    # (reb, no_kanji_bool, restr_list, frozenset of re_inf flags)
+    r_data = [
+        (r.find('reb').text,
+         r.find('re_nokanji') is not None,
+         [e.text for e in r.findall('re_restr') if e.text],
+         frozenset(e.text.strip('&;') for e in r.findall('re_inf') if e.text))
+        for r in entry_elem.findall('r_ele')
+    ]
+    return seq, k_data, r_data, senses
+
+
+def build_jmdict_data(entry_elems, kanji_word_data: Optional[KanjiWordData] = None, jobs: int = 1):
     """
-    Walk the parsed JMdict root and produce:
+    Walk the JMdict <entry> elements (see iter_jmdict_entries) and produce:
       entries    – {entry_id: [sense, ...]}
       lookup_map – {surface_form: [MapEntry, ...]}
 
     MapEntry = (written_form, reading_or_None, freq, entry_id)
 
-    lookup_map keys are keb or reb surface strings
+    lookup_map keys are keb or reb surface strings. The freq field holds the
+    (word, form) key into the frequency list (None: never ranked) until
+    apply_frequencies() replaces it, so this stage doesn't depend on the
+    frequency list. The pos_mask field is appended by add_pos_masks() once
+    all entries are known.
+
+    If `kanji_word_data` is given, it is fed every entry in the same pass.
+
+    With jobs > 1, chunks of entries are processed by a pool of worker processes
+    and merged back in input order, with synthetic IDs renumbered to match the
+    sequential numbering, so the output is identical to jobs=1.
     """
+    def raw_entry_chunks():
+        chunk = []
+        for entry_elem in entry_elems:
+            if kanji_word_data is not None:
+                kanji_word_data.add_entry(entry_elem)
+            raw_entry = _extract_entry(entry_elem)
+            if raw_entry is not None:
+                chunk.append(raw_entry)
+            if len(chunk) >= BUILD_CHUNK_ENTRIES:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
     entries    = {}
     lookup_map = defaultdict(list)
-    syn_id     = count(SYNTHETIC_ID_START)
+    n_synthetic = 0
+
+    def merge(chunk_result):
+        nonlocal n_synthetic
+        chunk_entries, chunk_lookup_map, chunk_synthetic = chunk_result
+        # chunks number their synthetic IDs from SYNTHETIC_ID_START; shift them behind the previous chunks
+        offset = n_synthetic
+        n_synthetic += chunk_synthetic
+
+        def shifted(entry_id):
+            return entry_id + offset if entry_id >= SYNTHETIC_ID_START else entry_id
+
+        for entry_id, senses in chunk_entries.items():
+            entries[shifted(entry_id)] = senses
+        for surface, me_list in chunk_lookup_map.items():
+            target = lookup_map[surface]
+            if offset:
+                target.extend((wf, rd, freq, shifted(entry_id)) for wf, rd, freq, entry_id in me_list)
+            else:
+                target.extend(me_list)
+
+    if jobs <= 1:
+        for chunk in raw_entry_chunks():
+            merge(_build_entry_chunk(chunk))
+    else:
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+            in_flight = []
+            for chunk in raw_entry_chunks():
+                in_flight.append(executor.submit(_build_entry_chunk, chunk))
+                if len(in_flight) >= jobs * CHUNKS_IN_FLIGHT_PER_JOB:
+                    merge(in_flight.pop(0).result())
+            for future in in_flight:
+                merge(future.result())
 
-    for entry_elem in root.iter('entry'):
-        seq    = int(entry_elem.find('ent_seq').text)
-        k_eles = entry_elem.findall('k_ele')
-        r_eles = entry_elem.findall('r_ele')
+    n_refs = sum(len(v) for v in lookup_map.values())
+    print(f"  {len(entries)} core entries | {n_refs} lookup refs")
+    return entries, lookup_map
 
-        # (keb, frozenset of ke_inf flags)
-        k_data = [
-            (k.find('keb').text,
-             frozenset(e.text.strip('&;') for e in k.findall('ke_inf') if e.text))
-            for k in k_eles
-        ]
 
-        # (reb, no_kanji_bool, restr_list, frozenset of re_inf flags)
-        r_data = [
-            (r.find('reb').text,
-             r.find('re_nokanji') is not None,
-             [e.text for e in r.findall('re_restr') if e.text],
-             frozenset(e.text.strip('&;') for e in r.findall('re_inf') if e.text))
-            for r in r_eles
-        ]
+def _build_entry_chunk(raw_entries: list) -> tuple:
+    """
+    Build (entries, lookup_map, n_synthetic_ids) for a list of _extract_entry() results.
+    Synthetic IDs start at SYNTHETIC_ID_START in every chunk, build_jmdict_data renumbers them.
+    """
+    entries    = {}
+    lookup_map = defaultdict(list)
+    syn_id     = count(SYNTHETIC_ID_START)
 
-        senses = _process_senses(entry_elem)
-        if not senses:
-            continue
+    for seq, k_data, r_data, senses in raw_entries:
 
         # Canonical forms: first form not marked search-only
         # None when all kanji forms are search-only — treat entry as kana-only for display
@@ -286,8 +468,7 @@ def build_jmdict_data(root, freq_map: dict):
                 dedup = (keb, written_form, reading, entry_id)
                 if dedup not in seen_lookup:
                     seen_lookup.add(dedup)
-                    freq = freq_map.get((keb, display_reb), DEFAULT_FREQ)
-                    lookup_map[keb].append((written_form, reading, freq, entry_id))
+                    lookup_map[keb].append((written_form, reading, (keb, display_reb), entry_id))
 
             # ── kana entries: one per surface reb ────────────────────────────
             seen_rebs: set = set()
@@ -312,18 +493,25 @@ def build_jmdict_data(root, freq_map: dict):
                 dedup = (reb, written_form, reading, entry_id)
                 if dedup not in seen_lookup:
                     seen_lookup.add(dedup)
-                    freq = freq_map.get((reb, display_reb), DEFAULT_FREQ) if reb == written_form else DEFAULT_FREQ
-                    lookup_map[reb].append((written_form, reading, freq, entry_id))
+                    freq_key = (reb, display_reb) if reb == written_form else None
+                    lookup_map[reb].append((written_form, reading, freq_key, entry_id))
 
-    n_refs = sum(len(v) for v in lookup_map.values())
-    print(f"  {len(entries)} core entries | {n_refs} lookup refs")
-    return entries, lookup_map
+    return entries, dict(lookup_map), next(syn_id) - SYNTHETIC_ID_START
+
+
+def apply_frequencies(lookup_map: dict, freq_map: dict):
+    """Replaces the frequency keys left in the freq field by build_jmdict_data with ranks, in place."""
+    for surface, me_list in lookup_map.items():
+        lookup_map[surface] = [
+            (wf, rd, freq_map.get(freq_key, DEFAULT_FREQ) if freq_key is not None else DEFAULT_FREQ, entry_id)
+            for wf, rd, freq_key, entry_id in me_list
+        ]
 
 
 # ── Kanjidic + IDS ─────────────────────────────────────────────────────────────
 
 def build_kanjidic_data(kanjidic_gz: bytes, ids_text: str,
-                        jmdict_root, freq_map: dict) -> dict:
+                        kanji_word_data: KanjiWordData, freq_map: dict) -> dict:
     """
     Build kanji_entries from kanjidic2 + CHISE IDS + JMdict example data.
     Returns {character: {character, meanings, readings, components, examples}}.
@@ -333,32 +521,9 @@ def build_kanjidic_data(kanjidic_gz: bytes, ids_text: str,
         if word not in word_freq or rank < word_freq[word]:
             word_freq[word] = rank
 
-    word_to_readings:    dict[str, list] = defaultdict(list)
-    word_to_jmdict_info: dict[str, dict] = {}
-    kanji_to_words:      dict[str, list] = defaultdict(list)
-
-    for entry_elem in jmdict_root.iter('entry'):
-        k_nodes = entry_elem.findall('k_ele')
-        r_nodes = entry_elem.findall('r_ele')
-        if not k_nodes or not r_nodes:
-            continue
-        all_tags    = ([t.text for t in entry_elem.findall('.//ke_pri')] +
-                       [t.text for t in entry_elem.findall('.//re_pri')])
-        is_priority = any(t in PRIORITY_TAGS for t in all_tags if t)
-        display_reb = r_nodes[0].find('reb').text
-        gloss_node  = entry_elem.find('.//sense/gloss')
-        display_m   = gloss_node.text if gloss_node is not None else ''
-        entry_readings = [kata_to_hira(r.find('reb').text) for r in r_nodes]
-        for k_node in k_nodes:
-            word = k_node.find('keb').text
-            if word not in word_freq:
-                continue
-            for r in entry_readings:
-                word_to_readings[word].append((r, is_priority))
-            word_to_jmdict_info[word] = {'r': display_reb, 'm': display_m}
-            for char in word:
-                if 0x4E00 <= ord(char) <= 0x9FFF:
-                    kanji_to_words[char].append(word)
+    word_to_readings    = kanji_word_data.word_to_readings
+    word_to_jmdict_info = kanji_word_data.word_to_jmdict_info
+    kanji_to_words      = kanji_word_data.kanji_to_words
 
     # Parse CHISE IDS
     ids_map: dict[str, list] = {}
@@ -397,6 +562,10 @@ def build_kanjidic_data(kanjidic_gz: bytes, ids_text: str,
         if m_node is not None and m_node.get('m_lang') is None and m_node.text:
             meaning_lookup[literal] = re.sub(r'\s*\(.*?\)', '', m_node.text).strip()
 
+    # word -> [(substrings of each reading without okurigana, is_priority), ...], shared by all its kanji
+    word_reading_index: dict[str, list] = {}
+    variants_cache:     dict[str, set]  = {}
+
     kanji_entries = {}
     for char_elem in kd_root.findall('character'):
         literal  = char_elem.find('literal').text
@@ -417,39 +586,44 @@ def build_kanjidic_data(kanjidic_gz: bytes, ids_text: str,
                 reading_attribs[h_stem].update({'type': 'kun', 'is_stem': True})
                 reading_attribs[h_full].update({'type': 'kun', 'is_full': True})
 
+        # variant -> positions (in reading_attribs order) of the candidate base readings it
+        # belongs to, once for the kanji standing alone and once for compounds
+        base_readings = list(reading_attribs)
+        standalone_index: dict[str, list] = defaultdict(list)
+        compound_index:   dict[str, list] = defaultdict(list)
+        for position, base_r in enumerate(base_readings):
+            attr = reading_attribs[base_r]
+            if base_r not in variants_cache:
+                variants_cache[base_r] = get_variants(base_r)
+            for variant in variants_cache[base_r]:
+                if attr['type'] == 'on' or attr['is_full']:
+                    standalone_index[variant].append(position)
+                if attr['type'] == 'on' or attr['is_stem']:
+                    compound_index[variant].append(position)
+
         total_score      = Counter()
         standalone_score = Counter()
         reading_to_words: dict[str, list] = defaultdict(list)
 
-        for word in set(kanji_to_words.get(literal, [])):
+        for word in set(w for w in kanji_to_words.get(literal, []) if w in word_freq):
             rank        = word_freq.get(word, 500_000)
             base_weight = 1_000_000 / (rank + 100)
-            for word_reading, is_priority in word_to_readings.get(word, []):
+            index       = standalone_index if word == literal else compound_index
+            info        = word_to_jmdict_info[word]
+            if word not in word_reading_index:
+                word_reading_index[word] = [(_substrings(_strip_okurigana(word, word_reading)), is_priority)
+                                            for word_reading, is_priority in word_to_readings.get(word, [])]
+            for substrings, is_priority in word_reading_index[word]:
                 weight  = base_weight * 10 if is_priority else base_weight
-                w_chars = list(word)
-                r_chars = list(word_reading)
-                while (w_chars and r_chars and
-                       is_hiragana(w_chars[-1]) and w_chars[-1] == r_chars[-1]):
-                    w_chars.pop()
-                    r_chars.pop()
-                extracted = ''.join(r_chars)
-                for base_r, attr in reading_attribs.items():
-                    is_cand = (
-                        attr['type'] == 'on' or
-                        (word == literal and attr['is_full']) or
-                        (word != literal and attr['is_stem'])
-                    )
-                    if not is_cand:
-                        continue
-                    for variant in get_variants(base_r):
-                        if variant in extracted:
-                            total_score[base_r] += weight
-                            if word == literal:
-                                standalone_score[base_r] += weight
-                            info = word_to_jmdict_info[word]
-                            reading_to_words[base_r].append(
-                                {'w': word, 'r': info['r'], 'm': info['m'], 'rank': rank})
-                            break
+                # a base reading matches if any of its variants occurs in the reading
+                matched = {position for sub in substrings for position in index.get(sub, ())}
+                for position in sorted(matched):
+                    base_r = base_readings[position]
+                    total_score[base_r] += weight
+                    if word == literal:
+                        standalone_score[base_r] += weight
+                    reading_to_words[base_r].append(
+                        {'w': word, 'r': info['r'], 'm': info['m'], 'rank': rank})
 
         for r in reading_to_words:
             reading_to_words[r].sort(key=lambda x: x['rank'])
@@ -500,15 +674,20 @@ def build_kanjidic_data(kanjidic_gz: bytes, ids_text: str,
 
 # ── Main ───────────────────────────────────────────────────────────────────────
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build dictionary.pkl from JMdict, kanjidic2, IDS and a frequency list')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes for JMdict entry processing (default: number of cores)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Rebuild every stage instead of reusing cached stage outputs')
+    args = parser.parse_args(argv)
+    use_cache = not args.no_cache
+
     ensure_dirs()
 
     print("\n[1/5] Loading source files ...")
-    jmdict_gz   = load_or_download('jmdict_e')
-    kanjidic_gz = load_or_download('kanjidic')
-    ids_bytes   = load_or_download('ids')
-    freq_bytes  = load_or_download('frequency')
-    ids_text    = ids_bytes.decode('utf-8', errors='replace')
+    source_paths  = {key: download_if_missing(key) for key in URLS}
+    source_hashes = {key: file_hash(path) for key, path in source_paths.items()}
 
     if not os.path.exists(DECONJUGATOR_PATH):
         print(f"ERROR: {DECONJUGATOR_PATH} not found.", file=sys.stderr)
@@ -518,26 +697,46 @@ def main():
     print(f"  {len(deconjugator_rules)} deconjugator rules loaded")
 
     print("\n[2/5] Parsing frequency list ...")
-    freq_map = load_freq_map(freq_bytes)
+    freq_map = load_freq_map(read_bytes(source_paths['frequency']))
 
     print("\n[3/5] Parsing JMdict_e ...")
     t0 = time.time()
-    jmdict_root = parse_jmdict_root(jmdict_gz)
-    entries, lookup_map = build_jmdict_data(jmdict_root, freq_map)
+
+    def parse_jmdict():
+        kanji_word_data = KanjiWordData()
+        entries, lookup_map = build_jmdict_data(iter_jmdict_entries(source_paths['jmdict_e']), kanji_word_data,
+                                                jobs=args.jobs)
+        return entries, dict(lookup_map), kanji_word_data
+
+    entries, lookup_map, kanji_word_data = run_stage(
+        'jmdict', stage_key(source_hashes['jmdict_e']), parse_jmdict, use_cache)
+    apply_frequencies(lookup_map, freq_map)
+    compact_entries(entries, lookup_map)
+    pos_vocab = add_pos_masks(entries, lookup_map, deconjugator_rules)
+    print(f"  {len(pos_vocab)} part-of-speech tags")
     print(f"  Done in {time.time() - t0:.1f}s")
 
     print("\n[4/5] Building kanjidic data ...")
     t0 = time.time()
-    kanji_entries = build_kanjidic_data(kanjidic_gz, ids_text, jmdict_root, freq_map)
+
+    def build_kanji():
+        ids_text = read_bytes(source_paths['ids']).decode('utf-8', errors='replace')
+        return build_kanjidic_data(read_bytes(source_paths['kanjidic']), ids_text, kanji_word_data, freq_map)
+
+    kanji_entries = run_stage(
+        'kanjidic', stage_key(*(source_hashes[key] for key in ('jmdict_e', 'kanjidic', 'ids', 'frequency'))),
+        build_kanji, use_cache)
     print(f"  Done in {time.time() - t0:.1f}s")
 
     print(f"\n[5/5] Saving dictionary to {OUTPUT_PATH} ...")
     t0 = time.time()
     payload = {
         'entries':            entries,
-        'lookup_map':         dict(lookup_map),
+        'lookup_map':         lookup_map,
         'kanji_entries':      kanji_entries,
         'deconjugator_rules': deconjugator_rules,
+        'pos_vocab':          pos_vocab,
+        'format_version':     DICT_FORMAT_VERSION,
     }
     with open(OUTPUT_PATH, 'wb') as f:
         pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,280 @@
+"""
+replay_session.py
+Replays a session recorded with `meikipop --record session.zip` through the real scan pipeline,
+without a display, a screen, input devices or network access, and reports per-stage latency.
+
+Usage:
+    meikipop replay session.zip [--speed 4] [--ocr-latency none] [-d dictionary.pkl] [--json report.json]
+
+The recorded frames and mouse/hotkey timeline are fed to the same OcrProcessor, HitScanner and Lookup
+threads the GUI runs, connected by the same LatestValueQueues. The ocr provider is replaced by one that
+returns the recorded results of each frame, after waiting as long as the original provider took
+(scaled by --speed, skipped at --speed 0 or with --ocr-latency none). Capture times are taken from the recording.
+The popup is replaced by a sink that completes every trace as soon as a result arrives, so 'display'
+is ~0 and 'total' is the pipeline latency without rendering.
+
+--speed 1 replays in real time, 4 four times faster and 0 as fast as possible. Like in the GUI,
+values that arrive faster than a stage can take them are coalesced, see the queue statistics.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from meikipop.config.config import DICT_PATH, config
+from meikipop.dictionary.lookup import Lookup
+from meikipop.ocr.hit_scan import HitScanner
+from meikipop.ocr.interface import OcrProvider, Paragraph
+from meikipop.ocr.ocr import OcrProcessor
+from meikipop.utils.lastest_queue import LatestValueQueue
+from meikipop.utils.logger import setup_logging
+from meikipop.utils.session_recorder import FRAME_INFO_KEY, SessionFrames, load_session, paragraphs_from_json
+from meikipop.utils.tracing import WINDOW_SIZE, TraceContext, pipeline_metrics
+
+IDLE_SECONDS = 0.5  # the pipeline counts as drained once no queue had work for this long
+DRAIN_TIMEOUT_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+class RecordedResultsProvider(OcrProvider):
+    """Returns the recorded ocr result of a replayed frame, optionally taking as long as the recorded scan."""
+    NAME = "Recorded results (replay)"
+
+    def __init__(self, results: Dict[int, Tuple[Optional[List[Paragraph]], float]], latency_factor: float):
+        self._results = results
+        self._latency_factor = latency_factor
+
+    def scan(self, image: Image.Image) -> Optional[List[Paragraph]]:
+        paragraphs, duration = self._results.get(image.info.get(FRAME_INFO_KEY), (None, 0.0))
+        if self._latency_factor:
+            time.sleep(duration * self._latency_factor)
+        return list(paragraphs) if paragraphs is not None else None
+
+
+class ReplayState:
+    """Same queues and events as the GUI's SharedState."""
+
+    def __init__(self):
+        self.running = True
+        self.screenshot_trigger_event = threading.Event()
+        self.ocr_queue = LatestValueQueue("ocr")
+        self.hit_scan_queue = LatestValueQueue("hit_scan")
+        self.lookup_queue = LatestValueQueue("lookup")
+        self.screen_lock = threading.RLock()
+
+
+class ReplayInput:
+    """Stands in for the InputLoop: the recorded cursor position and hotkey state."""
+
+    def __init__(self):
+        self.mouse_pos = (0, 0)
+        self.hotkey_is_pressed = False
+
+    def get_mouse_pos(self):
+        return self.mouse_pos
+
+
+class ReplayScreen:
+    """Stands in for the ScreenManager: the scan geometry of the latest replayed frame."""
+
+    def __init__(self):
+        self.geometry = (0, 0, 1, 1)
+
+    def get_scan_geometry(self):
+        return self.geometry
+
+    def force_screenshot_trigger(self):
+        pass
+
+
+class ReplayPopup:
+    """Stands in for the Popup: completes the trace of every result immediately."""
+
+    def __init__(self):
+        self.updates = 0
+        self.last_activity = time.perf_counter()
+
+    def set_latest_data(self, data, trace_context=None):
+        self.updates += 1
+        self.last_activity = time.perf_counter()
+        pipeline_metrics.finish(trace_context, self.last_activity)
+
+
+def _play(events: List[dict], frames: SessionFrames, speed: float, state: ReplayState,
+          replay_input: ReplayInput, screen: ReplayScreen):
+    """Feeds the recorded timeline into the pipeline, like the InputLoop and the ScreenManager would."""
+    start = time.perf_counter()
+    for event in events:
+        if speed > 0:
+            delay = start + event['t'] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        if event['type'] == 'input':
+            mouse_pos = tuple(event['mouse'])
+            replay_input.hotkey_is_pressed = event['hotkey']
+            if mouse_pos != replay_input.mouse_pos:
+                replay_input.mouse_pos = mouse_pos
+                state.hit_scan_queue.trigger(TraceContext('input'))
+        elif event['type'] == 'frame':
+            image = frames.get(event['frame'])  # decoded only now, so the session never has to fit in memory
+            if image is None:
+                logger.warning(f"Frame {event['frame']} is missing from the session, skipping it.")
+                continue
+            screen.geometry = tuple(event['geometry'])
+            trace_context = TraceContext('frame')
+            # the capture itself is not replayed, its recorded duration stands in for it
+            now = time.perf_counter()
+            trace_context.add_span('capture', now - event['capture_s'], now)
+            trace_context.created = now - event['capture_s']
+            pipeline_metrics.record('capture', event['capture_s'])
+            state.ocr_queue.put(image, trace_context)
+
+
+def _wait_until_drained(state: ReplayState, popup: ReplayPopup):
+    queues = (state.ocr_queue, state.hit_scan_queue, state.lookup_queue)
+    deadline = time.perf_counter() + DRAIN_TIMEOUT_SECONDS
+    idle_since = None
+    last_gets = None
+    while time.perf_counter() < deadline:
+        gets = tuple(q.gets for q in queues)
+        busy = any(q.has_pending() for q in queues) or gets != last_gets
+        last_gets = gets
+        now = time.perf_counter()
+        if busy or now - popup.last_activity < IDLE_SECONDS:
+            idle_since = None
+        elif idle_since is None:
+            idle_since = now
+        elif now - idle_since >= IDLE_SECONDS:
+            return
+        time.sleep(0.05)
+    logger.warning(f"The pipeline did not drain within {DRAIN_TIMEOUT_SECONDS}s.")
+
+
+def replay(session: dict, speed: float, replay_ocr_latency: bool, dictionary_path: str) -> dict:
+    events, frames = session['events'], session['frames']
+    ocr_results = {e['frame']: (paragraphs_from_json(e['paragraphs']), e['duration_s'])
+                   for e in events if e['type'] == 'ocr'}
+    latency_factor = (1 / speed if speed > 0 else 0.0) if replay_ocr_latency else 0.0
+
+    pipeline_metrics.resize(max(len(events), WINDOW_SIZE))  # percentiles over the whole session
+    state = ReplayState()
+    replay_input = ReplayInput()
+    screen = ReplayScreen()
+    popup = ReplayPopup()
+
+    lookup = Lookup(state, popup, dictionary_path=dictionary_path, warm_up_cache=False)
+    ocr_processor = OcrProcessor(state, screen, provider=RecordedResultsProvider(ocr_results, latency_factor))
+    hit_scanner = HitScanner(state, replay_input, screen)
+    for thread in (lookup, hit_scanner, ocr_processor):
+        thread.start()
+    load_start = time.perf_counter()
+    while not lookup.wait_until_ready(0.1):
+        if lookup.load_failed:
+            raise RuntimeError(f"Failed to load dictionary '{dictionary_path}'")
+    logger.info(f"Dictionary loaded in {time.perf_counter() - load_start:.2f}s, replaying {len(events)} events.")
+
+    start = time.perf_counter()
+    _play(events, frames, speed, state, replay_input, screen)
+    played = time.perf_counter()
+    _wait_until_drained(state, popup)
+    elapsed = max(played, popup.last_activity) - start  # without the idle time spent waiting for the drain
+
+    state.running = False
+    state.ocr_queue.put(None)
+    state.hit_scan_queue.trigger()
+    state.lookup_queue.put(None)
+
+    summary = pipeline_metrics.summary()
+    lookups = summary['stages'].get('lookup', {}).get('count', 0)
+    return {
+        'session': session['header'],
+        'speed': speed,
+        'ocr_latency': 'recorded' if latency_factor else 'none',  # never replayed at --speed 0
+        'elapsed_s': elapsed,
+        'recorded_s': events[-1]['t'] - events[0]['t'] if events else 0.0,
+        'events': {kind: sum(1 for e in events if e['type'] == kind) for kind in ('input', 'frame', 'ocr')},
+        'popup_updates': popup.updates,
+        'throughput': {
+            'frames_per_s': state.ocr_queue.gets / elapsed if elapsed else 0.0,
+            'lookups_per_s': lookups / elapsed if elapsed else 0.0,
+        },
+        'lookup_cache': lookup.lookup_cache.stats(),
+        **summary,
+    }
+
+
+def print_report(report: dict):
+    events = report['events']
+    print(f"Replayed {events['input']} input events and {events['frame']} frames "
+          f"({report['recorded_s']:.1f}s recorded) in {report['elapsed_s']:.1f}s "
+          f"at speed {report['speed'] or 'max'}, ocr latency {report['ocr_latency']}")
+    print(f"{report['popup_updates']} popup updates, {report['throughput']['frames_per_s']:.1f} frames/s, "
+          f"{report['throughput']['lookups_per_s']:.1f} lookups/s, "
+          f"lookup cache hit rate {report['lookup_cache']['hit_rate']:.1%}\n")
+    print(f"{'stage':<9} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, p in report['stages'].items():
+        print(f"{stage:<9} {p['count']:>6} {p['p50'] * 1000:>9.2f} {p['p95'] * 1000:>9.2f} {p['p99'] * 1000:>9.2f}")
+    print()
+    for name, q in report['queues'].items():
+        print(f"queue {name:<9} {q['puts']} puts, {q['overwrites']} overwritten, {q['gets']} gets "
+              f"({q['redelivered']} redelivered), {q['triggers']} triggers ({q['coalesced_triggers']} coalesced)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded session through the scan pipeline, headless')
+    parser.add_argument('session', help='Session file written by `meikipop --record`, or the .partial '
+                                        'directory it leaves behind when meikipop did not exit cleanly')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed, 1 = real time, 0 = as fast as possible (default: 1)')
+    parser.add_argument('--ocr-latency', choices=('recorded', 'none'), default='recorded',
+                        help='Wait as long as the recorded ocr scans took, or return results at once (default: recorded)')
+    parser.add_argument('-d', '--dictionary', default=DICT_PATH, help=f'Dictionary pickle (default: {DICT_PATH})')
+    parser.add_argument('--json', metavar='FILE', help='Also write the report to FILE as JSON')
+    parser.add_argument('--trace', metavar='FILE', help='Write pipeline spans to a Chrome trace-event JSON file')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every lookup like the GUI does')
+    args = parser.parse_args(argv)
+
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+    if not os.path.exists(args.session):
+        print(f"ERROR: Session file not found: {args.session}", file=sys.stderr)
+        sys.exit(1)
+    if not os.path.isfile(args.dictionary):
+        print(f"ERROR: Dictionary not found: {args.dictionary}", file=sys.stderr)
+        sys.exit(1)
+
+    setup_logging()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    session = load_session(args.session)
+    recorded = session['header'].get('config', {})
+    for name in ('max_lookup_length', 'lookup_prefetch_radius', 'lookup_cache_size_kb', 'show_kanji'):
+        if name in recorded:
+            setattr(config, name, recorded[name])  # only for this process, the config file is not saved
+
+    if args.trace:
+        pipeline_metrics.start_trace(args.trace)
+    try:
+        report = replay(session, args.speed, args.ocr_latency == 'recorded', args.dictionary)
+    finally:
+        pipeline_metrics.stop_trace()
+        session['frames'].close()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+serve.py
+Loads the dictionary once and answers lookups over localhost HTTP and/or a Unix socket,
+so texthookers, browser helpers and scripts can share one warm dictionary.
+
+Usage:
+    meikipop serve [--host 127.0.0.1] [--port 8765] [--socket /tmp/meikipop.sock] [--no-http] [--workers 4]
+
+HTTP:
+    GET  /lookup?text=食べた            -> {"text": ..., "results": [...]}
+    POST /lookup {"text": "食べた"}     -> {"text": ..., "results": [...]}
+    POST /lookup {"texts": [...]}       -> {"results": [[...], ...]}  (batch, same order as the input)
+    GET  /health                       -> {"status": "ok", ...}
+    GET  /stats                        -> lookup cache statistics
+
+Unix socket:
+    one JSON request per line (same bodies as POST /lookup), one JSON response per line.
+
+Every request may also set "max_length" (default: max_lookup_length from the config) and
+"kanji" (include the kanji entry of the first character, default: show_kanji from the config).
+Results are serialized DictionaryEntry/KanjiEntry objects, see entry_to_dict() in dictionary/lookup.py.
+With --workers, batches of at least POOL_MIN_BATCH_SIZE texts are spread over a LookupWorkerPool.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from meikipop.config.config import APP_NAME, APP_VERSION, DICT_PATH
+from meikipop.dictionary.lookup import LookupEngine, entry_to_dict
+from meikipop.dictionary.worker_pool import LookupWorkerPool
+from meikipop.utils.logger import setup_logging
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BATCH_SIZE = 10000
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+POOL_MIN_BATCH_SIZE = 512  # smaller batches are faster in-process than shipped to the workers
+
+logger = logging.getLogger(__name__)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _parse_bool(value) -> Optional[bool]:
+    if value is None or isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def handle_request(engine: LookupEngine, request, pool: Optional[LookupWorkerPool] = None) -> dict:
+    """Answers one lookup request (a dict with 'text' or 'texts', or a plain list of texts)."""
+    if isinstance(request, list):
+        request = {'texts': request}
+    if not isinstance(request, dict):
+        raise BadRequest("request must be a JSON object or a list of strings")
+
+    max_length = request.get('max_length')
+    if max_length is not None and (not isinstance(max_length, int) or max_length <= 0):
+        raise BadRequest("'max_length' must be a positive integer")
+    include_kanji = _parse_bool(request.get('kanji'))
+
+    def lookup(text):
+        if not isinstance(text, str):
+            raise BadRequest("texts must be strings")
+        return [entry_to_dict(e) for e in engine.lookup(text, max_length, include_kanji)]
+
+    if 'texts' in request:
+        texts = request['texts']
+        if not isinstance(texts, list):
+            raise BadRequest("'texts' must be a list of strings")
+        if len(texts) > MAX_BATCH_SIZE:
+            raise BadRequest(f"at most {MAX_BATCH_SIZE} texts per request")
+        if pool is not None and len(texts) >= POOL_MIN_BATCH_SIZE:
+            if not all(isinstance(text, str) for text in texts):
+                raise BadRequest("texts must be strings")
+            return {'results': [[entry_to_dict(e) for e in results]
+                                for results in pool.lookup_many(texts, max_length, include_kanji)]}
+        return {'results': [lookup(text) for text in texts]}
+    if 'text' in request:
+        return {'text': request['text'], 'results': lookup(request['text'])}
+    raise BadRequest("request needs a 'text' or 'texts' field")
+
+
+def _make_http_handler(engine: LookupEngine, pool: Optional[LookupWorkerPool]):
+    class LookupRequestHandler(BaseHTTPRequestHandler):
+        server_version = f"{APP_NAME}/{APP_VERSION}"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/health':
+                self._send_json(200, {'status': 'ok', 'version': APP_VERSION,
+                                      'entries': len(engine.dictionary.entries)})
+            elif url.path == '/stats':
+                self._send_json(200, engine.lookup_cache.stats())
+            elif url.path == '/lookup':
+                query = parse_qs(url.query)
+                request = {'kanji': query.get('kanji', [None])[0]}
+                if 'text' in query:
+                    request['text'] = query['text'][0]
+                if 'max_length' in query:
+                    try:
+                        request['max_length'] = int(query['max_length'][0])
+                    except ValueError:
+                        return self._send_json(400, {'error': "'max_length' must be a positive integer"})
+                self._answer(request)
+            else:
+                self._send_json(404, {'error': f"unknown path '{url.path}'"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/lookup':
+                return self._send_json(404, {'error': f"unknown path '{self.path}'"})
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_REQUEST_BYTES:
+                return self._send_json(413, {'error': "request too large"})
+            try:
+                request = json.loads(self.rfile.read(length) or b'null')
+            except ValueError as e:
+                return self._send_json(400, {'error': f"invalid JSON: {e}"})
+            self._answer(request)
+
+        def _answer(self, request):
+            try:
+                self._send_json(200, handle_request(engine, request, pool))
+            except BadRequest as e:
+                self._send_json(400, {'error': str(e)})
+            except Exception as e:
+                logger.exception("Lookup request failed.")
+                self._send_json(500, {'error': str(e)})
+
+        def _send_json(self, status: int, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Access-Control-Allow-Origin', '*')  # only reachable from this machine anyway
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} - {format % args}")
+
+    return LookupRequestHandler
+
+
+def _make_socket_handler(engine: LookupEngine, pool: Optional[LookupWorkerPool]):
+    class LookupStreamHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    response = handle_request(engine, json.loads(line), pool)
+                except (BadRequest, ValueError) as e:
+                    response = {'error': str(e)}
+                except Exception as e:
+                    logger.exception("Lookup request failed.")
+                    response = {'error': str(e)}
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+
+    return LookupStreamHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve dictionary lookups over localhost HTTP and/or a Unix socket')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'HTTP host (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'HTTP port (default: {DEFAULT_PORT})')
+    parser.add_argument('--no-http', action='store_true', help='Do not start the HTTP server')
+    parser.add_argument('--socket', metavar='PATH', help='Also listen on a Unix socket at PATH')
+    parser.add_argument('-d', '--dictionary', default=DICT_PATH,
+                        help=f'Dictionary pickle to serve (default: {DICT_PATH})')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Worker processes for large batch requests (default: 0, answer everything in-process)')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if args.no_http and not args.socket:
+        parser.error("nothing to serve: --no-http requires --socket")
+    if args.socket and not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+        parser.error("Unix sockets are not supported on this platform")
+
+    engine = LookupEngine()
+    if not engine.load(args.dictionary):
+        logger.critical("Failed to load dictionary.")
+        sys.exit(1)
+    # started before any server thread exists, so forked workers inherit a quiet process
+    pool = LookupWorkerPool(args.workers, args.dictionary, engine=engine) if args.workers > 0 else None
+
+    servers = []
+    if not args.no_http:
+        http_server = ThreadingHTTPServer((args.host, args.port), _make_http_handler(engine, pool))
+        http_server.daemon_threads = True
+        servers.append(http_server)
+        logger.info(f"Serving lookups on http://{args.host}:{http_server.server_address[1]}/lookup")
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)  # left over from a previous run
+        socket_server = socketserver.ThreadingUnixStreamServer(args.socket, _make_socket_handler(engine, pool))
+        socket_server.daemon_threads = True
+        servers.append(socket_server)
+        logger.info(f"Serving lookups on unix socket {args.socket}")
+
+    threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        if pool is not None:
+            pool.close()
+        engine.lookup_cache.log_stats()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""
+yomitan_banks.py
+Reads the term and frequency banks of a Yomitan/Yomichan dictionary zip and builds the
+entries and lookup_map of one dictionary. Shared by import_yomitan_dict_text.py and
+import_yomitan_dict_html.py, which only differ in how they turn definitions into glosses.
+
+Term banks are converted in parallel: every worker process loads one term_bank_*.json and
+extracts the glosses of its rows, which is where almost all of the import time goes. The
+main process merges the converted rows bank by bank in file order, so the result is the
+same for any number of workers. Rows are grouped by sequence number only after merging,
+because a sequence may continue in the next bank.
+
+With --append, the import is saved as a segment of an existing dictionary instead of
+replacing it (see customdict.save_segment): the dictionary keeps its own entries and merges
+the segment in when it is loaded, so adding a dictionary does not require rebuilding the rest.
+"""
+
+import json
+import multiprocessing
+import os
+import pickle
+import re
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+from meikipop.dictionary.customdict import SEGMENT_ID_STRIDE, save_segment, segment_number_for
+
+DEFAULT_FREQ = 999_999
+
+# Each dictionary's entry IDs start at this multiple of its index (0-based).
+# Allows up to 10 million entries per dictionary before collision.
+ID_NAMESPACE = 10_000_000
+
+BANKS_IN_FLIGHT_PER_JOB = 2
+
+# definitions array of a term row -> list of gloss strings
+GlossExtractor = Callable[[list], list]
+
+
+# ── Frequency parsing ──────────────────────────────────────────────────────────
+
+def parse_freq_value(freq_data) -> Optional[int]:
+    """
+    Extract a numeric frequency rank from a yomitan freq meta value.
+    Returns None if the value cannot be interpreted as a rank.
+    """
+    if isinstance(freq_data, (int, float)):
+        return int(freq_data)
+    if isinstance(freq_data, str):
+        try:
+            return int(freq_data)
+        except ValueError:
+            return None
+    if isinstance(freq_data, dict):
+        # {value: N, displayValue: "..."} — direct rank
+        if 'value' in freq_data:
+            return int(freq_data['value'])
+        # {reading: "...", frequency: ...} — nested
+        inner = freq_data.get('frequency')
+        if inner is not None:
+            return parse_freq_value(inner)
+    return None
+
+
+def load_freq_map_from_zip(zf: zipfile.ZipFile) -> dict:
+    """
+    Read all term_meta_bank_*.json files from an open zip and build:
+      {(term, reading_or_empty): freq_rank}
+    When reading is absent from the meta entry, key reading is ''.
+    Takes the minimum (best) rank seen for each key.
+    """
+    freq: dict = {}
+    for name in sorted(zf.namelist()):
+        if not re.match(r'term_meta_bank_\d+\.json', os.path.basename(name)):
+            continue
+        with zf.open(name) as f:
+            rows = json.load(f)
+        for row in rows:
+            if len(row) < 3 or row[1] != 'freq':
+                continue
+            term     = row[0]
+            raw      = row[2]
+            reading  = ''
+            if isinstance(raw, dict) and 'reading' in raw:
+                reading  = raw['reading']
+                rank_val = parse_freq_value(raw.get('frequency'))
+            else:
+                rank_val = parse_freq_value(raw)
+            if rank_val is None:
+                continue
+            key = (term, reading)
+            if key not in freq or rank_val < freq[key]:
+                freq[key] = rank_val
+    return freq
+
+
+# ── Term banks ─────────────────────────────────────────────────────────────────
+
+def term_bank_names(zf: zipfile.ZipFile) -> List[str]:
+    """Names of the term_bank_*.json files, in import order."""
+    return [name for name in sorted(zf.namelist())
+            if re.match(r'term_bank_\d+\.json', os.path.basename(name))]
+
+
+def convert_term_bank(zip_path: str, bank_name: str, extract_glosses: GlossExtractor) -> list:
+    """
+    Load one term bank and reduce its rows to (term, reading, sequence, sense_or_None),
+    where sense is {'glosses', 'pos', 'tags'} and None means the row has no usable glosses.
+    Rows with fewer than 6 fields are dropped.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zf, zf.open(bank_name) as f:
+        rows = json.load(f)
+
+    converted = []
+    for row in rows:
+        if len(row) < 6:
+            continue
+        def_tags_str  = row[2] if len(row) > 2 else ''
+        rules_str     = row[3] if len(row) > 3 else ''
+        definitions   = row[5] if len(row) > 5 else []
+        term_tags_str = row[7] if len(row) > 7 else ''
+        seq           = row[6] if len(row) > 6 else 0
+
+        sense = None
+        glosses = extract_glosses(definitions)
+        if glosses:
+            # Merge definition_tags and term_tags into our 'tags' field
+            all_tag_strings = (def_tags_str + ' ' + term_tags_str).split()
+            tags = [t for t in all_tag_strings if t]
+            # rules field (v1, v5k, adj-i ...) maps to pos
+            pos = [r for r in rules_str.split() if r]
+            sense = {'glosses': glosses, 'pos': pos, 'tags': tags}
+        converted.append((row[0], row[1], seq, sense))
+    return converted
+
+
+def iter_converted_banks(zip_path: str, bank_names: List[str], extract_glosses: GlossExtractor,
+                         jobs: int = 1) -> Iterator[list]:
+    """Yields convert_term_bank() for every bank in order, using `jobs` worker processes."""
+    if jobs <= 1 or len(bank_names) <= 1:
+        for name in bank_names:
+            yield convert_term_bank(zip_path, name, extract_glosses)
+        return
+
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    with ProcessPoolExecutor(max_workers=min(jobs, len(bank_names)), mp_context=context) as executor:
+        in_flight = []
+        for name in bank_names:
+            in_flight.append(executor.submit(convert_term_bank, zip_path, name, extract_glosses))
+            if len(in_flight) >= jobs * BANKS_IN_FLIGHT_PER_JOB:
+                yield in_flight.pop(0).result()
+        for future in in_flight:
+            yield future.result()
+
+
+# ── Building the internal structures ──────────────────────────────────────────
+
+def _has_kanji(text: str) -> bool:
+    return any(0x4E00 <= ord(c) <= 0x9FFF for c in text)
+
+
+def build_from_zip(zf: zipfile.ZipFile, dict_index: int, freq_override: dict,
+                   extract_glosses: GlossExtractor, jobs: int = 1) -> tuple:
+    """
+    Process one zip file and return (entries, lookup_map_additions).
+
+    entries: {entry_id: [sense, ...]}
+    lookup_map_additions: {surface: [(written_form, reading, freq, entry_id), ...]}
+
+    dict_index is used to namespace entry IDs: entry_id = dict_index * ID_NAMESPACE + sequence
+    freq_override allows the caller to pass in a pre-merged frequency map.
+    extract_glosses must be picklable (a module-level function or a method of a
+    picklable object) when jobs > 1.
+    """
+    freq_map = load_freq_map_from_zip(zf)
+    # Merge with any externally provided overrides (unused in standalone mode,
+    # kept for future additive use)
+    for k, v in freq_override.items():
+        if k not in freq_map or v < freq_map[k]:
+            freq_map[k] = v
+
+    # Group rows by sequence number.
+    # Rows with sequence 0 are treated as standalone (no grouping).
+    # For sequence > 0, all rows sharing a sequence form one entry.
+    # Within a sequence, we use the first term+reading pair seen as the
+    # canonical display form.
+    bank_names = term_bank_names(zf)
+    seq_groups: dict[int, list] = defaultdict(list)
+    standalone_counter = -1  # negative IDs for sequence-0 rows before namespacing
+    n_rows = 0
+    for bank_rows in iter_converted_banks(zf.filename, bank_names, extract_glosses, jobs):
+        n_rows += len(bank_rows)
+        for row in bank_rows:
+            if row[2] == 0:
+                # Each row is its own entry; give it a unique synthetic sequence
+                seq_groups[standalone_counter].append(row)
+                standalone_counter -= 1
+            else:
+                seq_groups[row[2]].append(row)
+    print(f"    {n_rows} term rows loaded from {len(bank_names)} bank(s)")
+
+    entries    = {}
+    lookup_map = defaultdict(list)
+    id_base    = dict_index * ID_NAMESPACE
+
+    # Frequency lookup: try (term, reading) then (term, '') as fallback
+    def get_freq(term: str, reading: str) -> int:
+        return freq_map.get((term, reading),
+                            freq_map.get((term, ''), DEFAULT_FREQ))
+
+    for seq, group_rows in seq_groups.items():
+        # Namespace the ID
+        if seq < 0:
+            # Standalone row: use id_base + offset from negative counter
+            entry_id = id_base + (ID_NAMESPACE + seq)  # e.g. id_base + 9999999, 9999998, ...
+        else:
+            entry_id = id_base + seq
+
+        # Determine canonical term and reading from the first row
+        canon_term, canon_read = group_rows[0][0], group_rows[0][1]  # reading is '' if term is kana-only
+
+        senses = [sense for _, _, _, sense in group_rows if sense is not None]
+        if not senses:
+            continue
+
+        entries[entry_id] = senses
+
+        # ── lookup_map entries ─────────────────────────────────────────────
+        # Collect all unique (term, reading) pairs across this group's rows.
+        # Each unique term surface gets one kanji-path entry;
+        # each unique reading surface gets one kana-path entry.
+        seen_terms:    set = set()
+        seen_readings: set = set()
+
+        for term, reading, _, _ in group_rows:  # reading '' means kana-only
+            # Kanji-path: term contains non-kana characters
+            if _has_kanji(term) and term not in seen_terms:
+                seen_terms.add(term)
+                display_read = reading if reading else canon_read
+                freq = get_freq(term, display_read)
+                lookup_map[term].append((canon_term, display_read, freq, entry_id))
+
+            # Kana-path
+            surface_kana = reading if reading else term
+            if surface_kana not in seen_readings:
+                seen_readings.add(surface_kana)
+                if reading:
+                    # Has kanji written form
+                    freq = get_freq(surface_kana, reading)
+                    lookup_map[surface_kana].append((canon_term, reading, freq, entry_id))
+                else:
+                    # Kana-only entry: written_form == surface, no separate reading
+                    freq = get_freq(term, '')
+                    lookup_map[term].append((term, None, freq, entry_id))
+
+    n_refs = sum(len(v) for v in lookup_map.values())
+    print(f"    {len(entries)} entries | {n_refs} lookup refs")
+    return entries, lookup_map
+
+
+# ── Output ─────────────────────────────────────────────────────────────────────
+
+def add_output_arguments(parser):
+    parser.add_argument('--append', action='store_true',
+                        help='Add the zip(s) as a segment of the existing output dictionary instead of replacing it')
+    parser.add_argument('--name', help='Segment name for --append; appending a name again replaces that segment '
+                                       '(default: title of the first zip)')
+    parser.add_argument('--priority', type=float,
+                        help='Added to the ranking priority of every result from the segment with --append (default: 0)')
+
+
+def dictionary_title(zip_path: str) -> str:
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        if 'index.json' in zf.namelist():
+            with zf.open('index.json') as f:
+                title = json.load(f).get('title')
+            if title:
+                return title
+    return os.path.splitext(os.path.basename(zip_path))[0]
+
+
+def first_dict_index(args) -> int:
+    """
+    The dict_index of the first zip. In --append mode this places the entry IDs in the ID range
+    of the segment (segment number * SEGMENT_ID_STRIDE), and resolves args.name, args.segment and
+    args.priority. Exits with an error first if a zip is missing or an option needs --append.
+    """
+    for zip_path in args.zips:
+        if not os.path.isfile(zip_path):
+            print(f"ERROR: File not found: {zip_path}", file=sys.stderr)
+            sys.exit(1)
+    if not args.append:
+        for option in ('name', 'priority'):
+            if getattr(args, option) is not None:
+                print(f"ERROR: --{option} only applies to --append", file=sys.stderr)
+                sys.exit(1)
+        return 0
+    if not os.path.isfile(args.output):
+        print(f"ERROR: --append needs an existing dictionary, {args.output} not found", file=sys.stderr)
+        sys.exit(1)
+    args.name = args.name or dictionary_title(args.zips[0])
+    args.segment = segment_number_for(args.output, args.name)
+    args.priority = args.priority or 0.0
+    return args.segment * (SEGMENT_ID_STRIDE // ID_NAMESPACE)
+
+
+def save_import(args, payload: dict):
+    """Writes the imported dictionary to args.output, or as segment args.name of it with --append."""
+    t0 = time.time()
+    if args.append:
+        print(f"\nSaving as segment '{args.name}' of {args.output} ...")
+        del payload['deconjugator_rules']  # always taken from the main dictionary
+        save_segment(args.output, args.segment, args.name, payload, priority=args.priority,
+                     sources=[os.path.basename(path) for path in args.zips])
+        print(f"Saved in {time.time() - t0:.1f}s")
+        return
+
+    print(f"\nSaving to {args.output} ...")
+    with open(args.output, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    size_mb = os.path.getsize(args.output) / 1_048_576
+    print(f"Saved {size_mb:.1f} MB in {time.time() - t0:.1f}s")
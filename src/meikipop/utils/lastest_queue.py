@@ -1,25 +1,92 @@
 # meikipop/utils/latest_queue.py
 import threading
 
+from meikipop.utils.tracing import pipeline_metrics
+
 
 class LatestValueQueue():
-    def __init__(self):
+    """
+    Single-slot queue: put() replaces any value that was not picked up yet, and trigger() wakes the consumer
+    with the current value again. The queue counts how often values are coalesced away and how often a
+    trigger re-delivers a value the consumer already had.
+    """
+
+    def __init__(self, name: str = "queue"):
+        self.name = name
         self._value = None
+        self._context = None
+        self._sequence = 0  # increases with every put(), a trigger() re-delivers the current one
+        self._last_delivered = 0  # sequence of the last value returned by get()
+        self._unread = False  # True while the latest put() has not been returned by get()
         self._lock = threading.Lock()
         self._event = threading.Event()
 
-    def put(self, item):
+        self.puts = 0
+        self.gets = 0
+        self.overwrites = 0  # puts that replaced a value nobody read
+        self.triggers = 0
+        self.coalesced_triggers = 0  # triggers that arrived while the consumer was already woken up
+        self.redelivered = 0  # gets that returned a value the consumer had already received
+        pipeline_metrics.register_queue(self)
+
+    def put(self, item, context=None):
         with self._lock:
+            self.puts += 1
+            if self._unread:
+                self.overwrites += 1
+                pipeline_metrics.mark(f"overwritten ({self.name})")
+            self._sequence += 1
+            self._unread = True
             self._value = item
+            self._context = context
             self._event.set()
 
     def get(self):
-        self._event.wait()
-        with self._lock:
-            value = self._value
-            self._event.clear()
-            return value
+        """Waits for a put/trigger and returns the latest value."""
+        return self.get_with_context()[0]
 
-    def trigger(self):
+    def get_with_context(self):
+        """Like get(), but also returns the TraceContext the value was put or triggered with (may be None)."""
+        while True:
+            self._event.wait()
+            with self._lock:
+                if not self._event.is_set():
+                    continue  # another consumer got there first
+                self._event.clear()
+                value, context = self._value, self._context
+                self._context = None
+                self.gets += 1
+                if self._sequence <= self._last_delivered:
+                    self.redelivered += 1
+                self._last_delivered = self._sequence
+                self._unread = False
+                return value, context
+
+    def has_pending(self) -> bool:
+        """True if a put/trigger is waiting to be picked up by get(). Never blocks."""
+        return self._event.is_set()
+
+    def trigger(self, context=None):
         with self._lock:
+            self.triggers += 1
+            if self._event.is_set():
+                self.coalesced_triggers += 1
+            if context is not None:
+                if self._context is None:
+                    self._context = context
+                else:
+                    # the pending value (e.g. an unread frame) is still delivered, so its trace is the one to
+                    # finish. the consumer serves this trigger with it, the new context is not followed any further
+                    pipeline_metrics.record_drop(f"{self.name} trigger")
             self._event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'puts': self.puts,
+                'gets': self.gets,
+                'overwrites': self.overwrites,
+                'triggers': self.triggers,
+                'coalesced_triggers': self.coalesced_triggers,
+                'redelivered': self.redelivered,
+            }
@@ -40,6 +40,11 @@ class MeikiPaths:
         """Location for cached downloads"""
         return self._platform_dirs.user_cache_dir
     
+    @property
+    def lookup_cache_path(self):
+        """Snapshot of frequent lookups, replayed at startup to warm the lookup cache"""
+        return os.path.join(self.cache_dir, 'lookup_cache.json')
+
     @property
     def main_dir(self):
         """Location of bundled resources (icons, etc.)"""
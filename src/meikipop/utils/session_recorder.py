@@ -0,0 +1,251 @@
+# meikipop/utils/session_recorder.py
+import dataclasses
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import zipfile
+from typing import List, Optional
+
+from PIL import Image
+
+from meikipop.ocr.interface import BoundingBox, Paragraph, Word
+
+logger = logging.getLogger(__name__)
+
+SESSION_FORMAT_VERSION = 1
+FRAME_INFO_KEY = 'meikipop_frame'  # key in Image.info that ties an ocr result to its recorded frame
+PARTIAL_SUFFIX = '.partial'  # directory a recording is written to until stop() packs it into the session file
+EVENT_FLUSH_SECONDS = 1.0  # events reach the disk at least this often while recording
+MAX_PENDING_FRAMES = 16  # frames waiting for the writer thread; more are not recorded rather than piling up
+
+
+def paragraphs_to_json(paragraphs: Optional[List[Paragraph]]) -> Optional[list]:
+    if paragraphs is None:
+        return None
+    return [dataclasses.asdict(paragraph) for paragraph in paragraphs]
+
+
+def paragraphs_from_json(data: Optional[list]) -> Optional[List[Paragraph]]:
+    if data is None:
+        return None
+    return [Paragraph(full_text=p['full_text'],
+                      words=[Word(text=w['text'], separator=w['separator'], box=BoundingBox(**w['box']))
+                             for w in p['words']],
+                      box=BoundingBox(**p['box']),
+                      is_vertical=p['is_vertical'])
+            for p in data]
+
+
+class SessionRecorder:
+    """
+    Records what the scan pipeline saw during a GUI session into a session file, so it can be replayed
+    headlessly later (see scripts/replay_session.py): the captured frames, the results the ocr provider
+    returned for them, and the mouse/hotkey timeline of the input loop.
+
+    The session file is a zip with one PNG per frame (frames/<n>.png) and events.jsonl, one event per line:
+        {"t": 0.52, "type": "input", "mouse": [812, 440], "hotkey": true}
+        {"t": 0.61, "type": "frame", "frame": 1, "geometry": [0, 0, 1920, 1080], "capture_s": 0.012}
+        {"t": 1.37, "type": "ocr", "frame": 1, "provider": "...", "duration_s": 0.75, "paragraphs": [...]}
+    `t` is seconds since the recording started. While recording, a writer thread encodes the frames and appends
+    the events to a <session file>.partial directory with the same layout, so the pipeline threads never wait
+    for it and a crash loses at most the last EVENT_FLUSH_SECONDS. stop() packs the directory into the zip;
+    load_session() reads either. Like the pipeline trace, recording is opt-in (--record) and costs nothing otherwise.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._directory: Optional[str] = None  # the .partial directory, None when not recording
+        self._origin = 0.0
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._events = 0
+        self._frames = 0
+        self._pending_frames = 0
+        self._skipped_frames = 0
+
+    @property
+    def recording(self) -> bool:
+        return self._directory is not None
+
+    def start(self, path: str, config_snapshot: Optional[dict] = None):
+        directory = os.path.abspath(path) + PARTIAL_SUFFIX
+        if os.path.exists(directory):
+            logger.warning(f"Replacing the unfinished recording in '{directory}'.")
+            shutil.rmtree(directory)
+        os.makedirs(os.path.join(directory, 'frames'))
+        with open(os.path.join(directory, 'session.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': SESSION_FORMAT_VERSION,
+                'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'config': config_snapshot or {},
+            }, f, ensure_ascii=False, indent=2)
+        events_file = open(os.path.join(directory, 'events.jsonl'), 'w', encoding='utf-8')
+        with self._lock:
+            self._path = path
+            self._origin = time.perf_counter()
+            self._queue = queue.Queue()
+            self._events = self._frames = self._pending_frames = self._skipped_frames = 0
+            self._writer = threading.Thread(target=self._write_loop, args=(directory, events_file, self._queue),
+                                            daemon=True, name="SessionWriter")
+            self._writer.start()
+            self._directory = directory
+        logger.info(f"Recording session to '{path}'.")
+
+    def stop(self):
+        with self._lock:
+            directory, self._directory = self._directory, None
+            if directory is None:
+                return
+            self._queue.put(None)
+        self._writer.join()
+        try:
+            with zipfile.ZipFile(self._path + '.tmp', 'w', zipfile.ZIP_STORED) as session_zip:
+                for root, _, files in os.walk(directory):
+                    for name in sorted(files):
+                        file_path = os.path.join(root, name)
+                        session_zip.write(file_path, os.path.relpath(file_path, directory).replace(os.sep, '/'))
+            os.replace(self._path + '.tmp', self._path)
+            shutil.rmtree(directory)
+        except OSError as e:
+            logger.error(f"Could not write session file '{self._path}': {e}. The recording is kept in '{directory}'.")
+            return
+        skipped = f", {self._skipped_frames} frames skipped while the writer was busy" if self._skipped_frames else ""
+        logger.info(f"Wrote session with {self._frames} frames and {self._events} events to '{self._path}'{skipped}.")
+
+    def record_input(self, mouse_pos, hotkey_pressed: bool):
+        if self._directory is None:
+            return
+        self._add_event({'type': 'input', 'mouse': list(mouse_pos), 'hotkey': hotkey_pressed})
+
+    def record_frame(self, image: Image.Image, geometry, capture_duration: float):
+        """Queues a frame that goes to ocr for writing. The frame number is kept in image.info for record_ocr()."""
+        if self._directory is None:
+            return
+        with self._lock:
+            if self._directory is None:
+                return
+            if self._pending_frames >= MAX_PENDING_FRAMES:
+                self._skipped_frames += 1
+                return
+            self._pending_frames += 1
+            self._frames += 1
+            frame = self._frames
+            self._queue.put(('frame', frame, image))
+        image.info[FRAME_INFO_KEY] = frame
+        self._add_event({'type': 'frame', 'frame': frame, 'geometry': list(geometry),
+                         'capture_s': capture_duration})
+
+    def record_ocr(self, image: Image.Image, provider_name: str, paragraphs: Optional[List[Paragraph]],
+                   duration: float):
+        if self._directory is None or FRAME_INFO_KEY not in image.info:
+            return
+        # paragraphs are converted to JSON by the writer thread
+        self._add_event({'type': 'ocr', 'frame': image.info[FRAME_INFO_KEY], 'provider': provider_name,
+                         'duration_s': duration, 'paragraphs': paragraphs})
+
+    def _add_event(self, event: dict):
+        event['t'] = time.perf_counter() - self._origin
+        with self._lock:
+            if self._directory is not None:
+                self._events += 1
+                self._queue.put(('event', event))
+
+    def _write_loop(self, directory: str, events_file, jobs: queue.Queue):
+        last_flush = time.perf_counter()
+        with events_file:
+            while True:
+                try:
+                    job = jobs.get(timeout=EVENT_FLUSH_SECONDS)
+                except queue.Empty:
+                    job = ()
+                if job is None:
+                    break
+                try:
+                    if job and job[0] == 'frame':
+                        _, frame, image = job
+                        frame_path = os.path.join(directory, 'frames', f'{frame}.png')
+                        image.save(frame_path + '.tmp', format='PNG', compress_level=1)
+                        os.replace(frame_path + '.tmp', frame_path)
+                        with self._lock:
+                            self._pending_frames -= 1
+                    elif job:
+                        event = job[1]
+                        if event['type'] == 'ocr':
+                            event['paragraphs'] = paragraphs_to_json(event['paragraphs'])
+                        events_file.write(json.dumps(event, ensure_ascii=False) + '\n')
+                except Exception:
+                    logger.exception("Failed to write to the session recording.")
+                if time.perf_counter() - last_flush >= EVENT_FLUSH_SECONDS:
+                    events_file.flush()
+                    last_flush = time.perf_counter()
+
+
+class SessionFrames:
+    """
+    The contents of a session file, or of the .partial directory of a recording that was not stopped.
+    Frames are decoded only when get() asks for them, so a long session never has to fit in memory.
+    """
+
+    def __init__(self, path: str):
+        self._directory = path if os.path.isdir(path) else None
+        self._zip = None if self._directory else zipfile.ZipFile(path, 'r')
+        if self._directory:
+            names = ['frames/' + name for name in os.listdir(os.path.join(path, 'frames'))]
+        else:
+            names = self._zip.namelist()
+        self.numbers = {int(name[len('frames/'):-len('.png')]) for name in names
+                        if name.startswith('frames/') and name.endswith('.png')}
+
+    def read(self, name: str) -> bytes:
+        if self._directory:
+            with open(os.path.join(self._directory, *name.split('/')), 'rb') as f:
+                return f.read()
+        return self._zip.read(name)
+
+    def get(self, number: int) -> Optional[Image.Image]:
+        """The decoded frame, tagged with its number for the recorded results, or None if it is missing."""
+        if number not in self.numbers:
+            return None
+        image = Image.open(io.BytesIO(self.read(f'frames/{number}.png')))
+        image.load()
+        image.info[FRAME_INFO_KEY] = number
+        return image
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+
+
+def load_session(path: str) -> dict:
+    """
+    Reads a session file or an unfinished recording's .partial directory:
+    {'header': {...}, 'events': [...] (by time), 'frames': SessionFrames}. Close the frames when done.
+    """
+    frames = SessionFrames(path)
+    try:
+        header = json.loads(frames.read('session.json'))
+        if header.get('format') != SESSION_FORMAT_VERSION:
+            raise ValueError(f"Unsupported session format {header.get('format')} in '{path}'")
+        events = []
+        for line in frames.read('events.jsonl').decode('utf-8', errors='replace').splitlines():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue  # the last line of a recording that was cut off
+    except Exception:
+        frames.close()
+        raise
+    events.sort(key=lambda e: e['t'])
+    return {'header': header, 'events': events, 'frames': frames}
+
+
+session_recorder = SessionRecorder()
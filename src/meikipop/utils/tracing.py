@@ -0,0 +1,282 @@
+# meikipop/utils/tracing.py
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# stages in pipeline order. 'total' is the time from the trace's origin (a captured frame or a mouse event)
+# until the popup picked up the result.
+STAGES = ('capture', 'ocr', 'hit_scan', 'lookup', 'display', 'total')
+WINDOW_SIZE = 500  # number of samples per stage the percentiles are computed over
+SUMMARY_LOG_INTERVAL = 200  # log a debug summary every n finished traces
+
+_trace_ids = itertools.count(1)
+
+
+class TraceContext:
+    """
+    Follows one frame (origin 'frame') or one mouse event (origin 'input') through the scan pipeline.
+
+    The context is handed from stage to stage alongside the data in the LatestValueQueues. Each stage
+    records its span into it, so a finished trace tells exactly where the time of one popup update went.
+    """
+    __slots__ = ('trace_id', 'origin', 'created', 'spans', 'finished')
+
+    def __init__(self, origin: str):
+        self.trace_id = next(_trace_ids)
+        self.origin = origin
+        self.created = time.perf_counter()
+        self.spans: List[Tuple[str, str, float, float]] = []  # (stage, thread name, start, end)
+        self.finished = False
+
+    def add_span(self, stage: str, start: float, end: float):
+        self.spans.append((stage, threading.current_thread().name, start, end))
+
+    def __repr__(self):
+        stages = ", ".join(f"{stage}={(end - start) * 1000:.1f}ms" for stage, _, start, end in self.spans)
+        return f"TraceContext(#{self.trace_id} {self.origin}: {stages})"
+
+
+class ChromeTraceWriter:
+    """
+    Streams spans to a Chrome trace-event JSON file (chrome://tracing, ui.perfetto.dev), one lane per thread.
+
+    Events are appended as they happen, so a session that ends abruptly still leaves a loadable file
+    (the trace-event format allows the closing bracket to be missing).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._thread_ids: Dict[int, int] = {}
+        self._pid = os.getpid()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('[\n')
+        self._write({'ph': 'M', 'name': 'process_name', 'pid': self._pid, 'tid': 0, 'args': {'name': 'meikipop'}})
+
+    def complete(self, name: str, start: float, end: float, args: Optional[dict] = None):
+        """A span on the calling thread's lane. `start` and `end` are time.perf_counter() values."""
+        event = {'ph': 'X', 'name': name, 'ts': self._us(start), 'dur': max(0.0, (end - start) * 1e6)}
+        if args:
+            event['args'] = args
+        self._write_for_current_thread(event)
+
+    def instant(self, name: str, args: Optional[dict] = None):
+        event = {'ph': 'i', 's': 't', 'name': name, 'ts': self._us(time.perf_counter())}
+        if args:
+            event['args'] = args
+        self._write_for_current_thread(event)
+
+    def flow(self, phase: str, trace_id: int, timestamp: float):
+        """Flow arrows connect the spans of one TraceContext across threads. phase is 's', 't' or 'f'."""
+        event = {'ph': phase, 'name': 'trace', 'cat': 'pipeline', 'id': trace_id, 'ts': self._us(timestamp)}
+        if phase == 'f':
+            event['bp'] = 'e'
+        self._write_for_current_thread(event)
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write('{}]\n')
+            self._file.close()
+        logger.info(f"Wrote pipeline trace to '{self.path}'.")
+
+    def _us(self, timestamp: float) -> float:
+        return (timestamp - self._origin) * 1e6
+
+    def _write_for_current_thread(self, event: dict):
+        thread = threading.current_thread()
+        with self._lock:
+            if self._file.closed:
+                return
+            tid = self._thread_ids.get(thread.ident)
+            if tid is None:
+                tid = self._thread_ids[thread.ident] = len(self._thread_ids) + 1
+                self._write({'ph': 'M', 'name': 'thread_name', 'pid': self._pid, 'tid': tid,
+                             'args': {'name': thread.name}})
+            event['pid'] = self._pid
+            event['tid'] = tid
+            self._write(event)
+
+    def _write(self, event: dict):
+        self._file.write(json.dumps(event, ensure_ascii=False))
+        self._file.write(',\n')
+
+
+class PipelineMetrics:
+    """Rolling per-stage latency percentiles and drop counts for the scan pipeline. Thread-safe."""
+
+    def __init__(self, window_size: int = WINDOW_SIZE):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {stage: deque(maxlen=window_size) for stage in STAGES}
+        self._window_size = window_size
+        self.dropped: Dict[str, int] = {}  # consumer -> number of values that were replaced before being read
+        self._queues = weakref.WeakKeyDictionary()  # live LatestValueQueue -> registration order
+        self._queue_order = itertools.count()
+        self.finished_traces = 0
+        self.trace_writer: Optional[ChromeTraceWriter] = None  # set by start_trace(), opt-in via --trace
+
+    def resize(self, window_size: int):
+        """Changes the number of samples per stage the percentiles are computed over, keeping the newest ones."""
+        with self._lock:
+            self._window_size = window_size
+            self._samples = {stage: deque(samples, maxlen=window_size) for stage, samples in self._samples.items()}
+
+    def start_trace(self, path: str):
+        self.trace_writer = ChromeTraceWriter(path)
+        logger.info(f"Recording pipeline trace to '{path}'.")
+
+    def stop_trace(self):
+        trace_writer, self.trace_writer = self.trace_writer, None
+        if trace_writer:
+            trace_writer.close()
+
+    @contextmanager
+    def span(self, stage: str, context: Optional[TraceContext] = None):
+        """Times the enclosed block as `stage`, and records it in `context` if there is one."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.record(stage, end - start)
+            if context is not None:
+                self._trace_flow(context, 't' if context.spans else 's', start)
+                context.add_span(stage, start, end)
+            trace_writer = self.trace_writer
+            if trace_writer:
+                trace_writer.complete(stage, start, end, {'trace_id': context.trace_id} if context else None)
+
+    @contextmanager
+    def trace(self, name: str):
+        """Like span(), but only shows up in the trace file (e.g. lock waits). Costs nothing when not tracing."""
+        if not self.trace_writer:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace_writer = self.trace_writer
+            if trace_writer:
+                trace_writer.complete(name, start, time.perf_counter())
+
+    @contextmanager
+    def locked(self, lock, name: str):
+        """Holds `lock` for the enclosed block. When tracing, the wait and the hold show up as separate spans."""
+        with self.trace(f"{name} wait"):
+            lock.acquire()
+        try:
+            with self.trace(f"{name} held"):
+                yield
+        finally:
+            lock.release()
+
+    def record(self, stage: str, duration: float):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self._window_size)
+            samples.append(duration)
+
+    def record_drop(self, consumer: str):
+        """
+        For values or traces that are coalesced away without a LatestValueQueue overwrite: results the popup
+        never showed, or trigger contexts that joined a pending value (see LatestValueQueue.trigger()).
+        """
+        with self._lock:
+            self.dropped[consumer] = self.dropped.get(consumer, 0) + 1
+        self.mark(f"dropped ({consumer})")
+
+    def mark(self, name: str):
+        """An instant event in the trace file. Costs nothing when not tracing."""
+        trace_writer = self.trace_writer
+        if trace_writer:
+            trace_writer.instant(name)
+
+    def register_queue(self, latest_value_queue):
+        """Adds the queue's counters to summary() for as long as the queue is alive."""
+        with self._lock:
+            self._queues[latest_value_queue] = next(self._queue_order)
+
+    def finish(self, context: Optional[TraceContext], displayed_since: float):
+        """Called by the popup once it picked up the result of `context`. Records 'display' and 'total'."""
+        if context is None or context.finished:
+            return
+        context.finished = True
+        now = time.perf_counter()
+        context.add_span('display', displayed_since, now)
+        self.record('display', now - displayed_since)
+        self.record('total', now - context.created)
+        trace_writer = self.trace_writer
+        if trace_writer:
+            trace_writer.complete('display', displayed_since, now, {'trace_id': context.trace_id})
+            trace_writer.flow('f', context.trace_id, now)
+        with self._lock:
+            self.finished_traces += 1
+            log_summary = self.finished_traces % SUMMARY_LOG_INTERVAL == 0
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"{context} total={(now - context.created) * 1000:.1f}ms")
+            if log_summary:
+                self.log_summary(logging.DEBUG)
+
+    def _trace_flow(self, context: TraceContext, phase: str, timestamp: float):
+        trace_writer = self.trace_writer
+        if trace_writer:
+            trace_writer.flow(phase, context.trace_id, timestamp)
+
+    def percentiles(self, stage: str) -> Optional[Dict[str, float]]:
+        """p50/p95/p99 (in seconds) over the last WINDOW_SIZE samples of `stage`, or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if not samples:
+            return None
+
+        def at(q):
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+        return {'count': len(samples), 'p50': at(0.50), 'p95': at(0.95), 'p99': at(0.99)}
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = list(self._samples)
+            dropped = dict(self.dropped)
+            # LatestValueQueues keep their own counters
+            queues = [q for q, _ in sorted(self._queues.items(), key=lambda item: item[1])]
+        return {
+            'stages': {stage: p for stage in stages if (p := self.percentiles(stage))},
+            'queues': {q.name: q.stats() for q in queues},
+            'dropped': dropped,
+        }
+
+    def log_summary(self, level=logging.INFO):
+        summary = self.summary()
+        if not summary['stages']:
+            return
+        lines = [f"  {stage:<9} p50 {p['p50'] * 1000:7.1f}ms  p95 {p['p95'] * 1000:7.1f}ms  "
+                 f"p99 {p['p99'] * 1000:7.1f}ms  (n={p['count']})" for stage, p in summary['stages'].items()]
+        for name, q in summary['queues'].items():
+            # overwritten values never reached the consumer. many overwrites on the ocr queue mean ocr can't keep up
+            # with auto_scan_interval_seconds, many redeliveries mean work was repeated on an unchanged value.
+            lines.append(f"  queue {name:<9} {q['puts']} puts, {q['overwrites']} overwritten, {q['gets']} gets "
+                         f"({q['redelivered']} redelivered), {q['triggers']} triggers "
+                         f"({q['coalesced_triggers']} coalesced)")
+        if summary['dropped']:
+            lines.append("  dropped before display: " +
+                         ", ".join(f"{name}: {count}" for name, count in summary['dropped'].items()))
+        logger.log(level, "Pipeline latency:\n" + "\n".join(lines))
+
+
+pipeline_metrics = PipelineMetrics()